@@ -0,0 +1,406 @@
+"""离线批量对话处理。
+
+从 JSONL 读取 {"session_id": ..., "utterance": ...} 记录，按会话分片到工作线程并行回放，
+同一会话内的轮次严格保持输入顺序，结果以 JSONL 流式写出。
+
+- 有界内存：读取、处理、写出之间均为有界队列，输入再大也不会整体载入内存；
+  每个工作线程最多常驻 --max-sessions 个会话上下文，最久未活动的会话以快照形式溢出到临时 SQLite 文件，
+  再次出现时从快照恢复 (与断点续跑使用同一份 to_dict/from_dict 快照)。
+- 断点续跑：输出文件本身即检查点，每条记录都带有输入行号和会话状态快照；
+  使用 --resume 时跳过已完成的行，各会话最后一条快照按分片直接写入对应工作线程的溢出文件，
+  会话再次出现时从快照恢复继续处理。
+
+用法:
+    python batch_runner.py transcripts.jsonl results.jsonl --workers 16 --resume
+"""
+import argparse
+import contextlib
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from interpreter_core import (
+    InterpreterCore, DialogueContext, DSL_DIR, NLU_MODEL, DATA_STORAGE, EXIT_COMMANDS
+)
+from dsl_manager import DSLManager
+from data_manager import DataManager
+from nlu_engine import NLUCascade
+
+DEFAULT_WORKERS = 8
+QUEUE_SIZE = 256            # 每个队列的容量上限
+CHECKPOINT_EVERY = 100      # 每写出 N 条记录落盘一次
+MAX_SESSIONS_PER_WORKER = 1000  # 每个工作线程常驻内存的会话上限
+
+_STOP = object()
+
+
+def load_checkpoint(output_path: str,
+                    restore: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None) -> bytearray:
+    """读取已有输出，返回已完成行号位图。
+
+    每条带快照的记录按文件顺序回调 restore(session_id, 快照)，会话已结束时快照为 None；
+    快照不在内存中汇总，由调用方直接落盘。
+    崩溃时可能残留半行记录，这里会把文件截断到最后一条完整记录。
+    """
+    done = bytearray()
+    if not os.path.exists(output_path):
+        return done
+
+    valid_bytes = 0
+    with open(output_path, mode='rb') as file:
+        for raw in file:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            valid_bytes += len(raw)
+
+            line_no = record["line"]
+            if line_no >= len(done):
+                done.extend(bytes(line_no + 1 - len(done)))
+            done[line_no] = 1
+            context = record.get("context")
+            if context is None or restore is None:
+                continue
+            # 已结束的会话在正常运行时会被丢弃，下一轮重新开始；续跑时保持一致，不恢复结束状态
+            restore(record["session_id"], context if context.get("session_active", True) else None)
+
+    if valid_bytes != os.path.getsize(output_path):
+        print(f"[批处理] 检查点末尾存在不完整记录，截断到 {valid_bytes} 字节", file=sys.stderr)
+        with open(output_path, mode='r+b') as file:
+            file.truncate(valid_bytes)
+    return done
+
+
+def open_spill(spill_path: str) -> sqlite3.Connection:
+    """打开 (必要时创建) 会话快照溢出文件；文件是临时的，不需要日志和同步落盘"""
+    db = sqlite3.connect(spill_path)
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, snapshot TEXT NOT NULL)")
+    return db
+
+
+class SessionCache:
+    """工作线程内的会话上下文 LRU 缓存，超出容量的会话以快照形式溢出到磁盘。
+
+    SQLite 连接在首次溢出时创建 (续跑时溢出文件已预先写入恢复的快照，构造时即打开)，
+    只能在所属的工作线程中使用。
+    """
+
+    def __init__(self, capacity: int, spill_path: str):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.spilled = 0
+        self._live: "OrderedDict[str, DialogueContext]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = open_spill(spill_path) if os.path.exists(spill_path) else None
+
+    def get(self, session_id: str) -> Optional[DialogueContext]:
+        context = self._live.get(session_id)
+        if context is not None:
+            self._live.move_to_end(session_id)
+            return context
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT snapshot FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return DialogueContext.from_dict(json.loads(row[0])) if row else None
+
+    def put(self, session_id: str, context: DialogueContext):
+        self._live[session_id] = context
+        self._live.move_to_end(session_id)
+        while len(self._live) > self.capacity:
+            evicted_id, evicted = self._live.popitem(last=False)
+            if self._db is None:
+                self._db = open_spill(self.spill_path)
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?)",
+                (evicted_id, json.dumps(evicted.to_dict(), ensure_ascii=False))
+            )
+            self.spilled += 1
+
+    def discard(self, session_id: str):
+        self._live.pop(session_id, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def iter_input(input_path: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """逐行读取输入，产出 (行号, 记录, 错误信息)。"""
+    with open(input_path, mode='r', encoding='utf-8') as file:
+        for line_no, raw in enumerate(file):
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+                if not isinstance(record, dict):
+                    raise ValueError("记录必须是 JSON 对象")
+                if record.get("session_id") is None or record.get("utterance") is None:
+                    raise ValueError("缺少 session_id 或 utterance 字段 (或值为 null)")
+                yield line_no, record, None
+            except ValueError as e:
+                yield line_no, None, str(e)
+
+
+class BatchRunner:
+    """按会话分片的批处理流水线：读取线程 -> N 个工作线程 -> 写出线程。
+
+    NLU 调用以网络 I/O 为主，因此工作池使用线程；每个工作线程持有一个 InterpreterCore，
+    处理某会话的轮次前切换到该会话的 DialogueContext。DSL 配置与 DataManager 全局共享。
+    """
+
+    def __init__(self, input_path: str, output_path: str, workers: int = DEFAULT_WORKERS,
+                 resume: bool = False, dsl_dir: str = DSL_DIR, nlu_model: str = NLU_MODEL,
+                 data_storage: str = DATA_STORAGE, cascade: bool = False,
+                 max_sessions: int = MAX_SESSIONS_PER_WORKER):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.workers = workers
+        self.resume = resume
+        self.max_sessions = max_sessions
+        self._spill_dir: Optional[str] = None
+        self.nlu_model = nlu_model
+        self.nlu_cascade = NLUCascade() if cascade else None
+
+        self.dsl_manager = DSLManager(dsl_dir)
+        self.data_manager = DataManager(storage=data_storage)
+
+        self._inboxes = [queue.Queue(maxsize=QUEUE_SIZE) for _ in range(workers)]
+        self._results: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._stats_lock = threading.Lock()
+        self.stats = {"processed": 0, "skipped": 0, "errors": 0, "spilled_sessions": 0}
+
+    def _new_interpreter(self) -> InterpreterCore:
+        return InterpreterCore(
+            self.dsl_manager.dsl_dir, self.nlu_model,
+            dsl_manager=self.dsl_manager, data_manager=self.data_manager,
+            nlu_cascade=self.nlu_cascade
+        )
+
+    def _open_context(self, interpreter: InterpreterCore, session_id: str) -> DialogueContext:
+        initial_domain = "Customer_Service"
+        context = DialogueContext(self.dsl_manager.get_initial_state(initial_domain))
+        context.current_domain = initial_domain
+        interpreter.context = context
+        interpreter.start_session()
+        return context
+
+    def _run_turn(self, interpreter: InterpreterCore, line_no: int, session_id: str,
+                  utterance: str) -> Dict[str, Any]:
+        context = interpreter.context
+        context.last_nlu_result = {}
+        context.last_responses = []
+        context.last_timings = {}
+        error = None
+
+        start = time.perf_counter()
+        if utterance.lower() in EXIT_COMMANDS:
+            context.session_active = False
+            context.last_responses = ["会话结束。"]
+        else:
+            try:
+                interpreter.process_turn(utterance)
+            except Exception as e:
+                error = str(e)
+                interpreter.recover_from_error(e)
+        timings = dict(context.last_timings)
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+
+        return {
+            "line": line_no,
+            "session_id": session_id,
+            "utterance": utterance,
+            "domain": context.current_domain,
+            "state": context.current_state,
+            "intent": context.last_nlu_result.get("intent"),
+            "model": context.last_nlu_result.get("model", self.nlu_model),
+            "slots": context.last_nlu_result.get("slots", {}),
+            "response": "\n".join(context.last_responses),
+            "timings": timings,
+            "error": error,
+            "context": context.to_dict(),
+        }
+
+    def _worker(self, index: int, inbox: queue.Queue):
+        interpreter = self._new_interpreter()
+        sessions = SessionCache(self.max_sessions, self._spill_path(index))
+        try:
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    break
+                line_no, session_id, utterance = item
+
+                try:
+                    context = sessions.get(session_id)
+                    if context is None:
+                        context = self._open_context(interpreter, session_id)
+                    interpreter.context = context
+
+                    record = self._run_turn(interpreter, line_no, session_id, utterance)
+                except Exception as e:
+                    # 工作线程不能退出，否则对应分片的队列会被塞满导致整个流水线阻塞
+                    self._results.put({"line": line_no, "session_id": session_id, "error": str(e), "context": None})
+                    continue
+                # 已结束的会话不再保留状态，控制常驻内存
+                if context.session_active:
+                    sessions.put(session_id, context)
+                else:
+                    sessions.discard(session_id)
+                self._results.put(record)
+        finally:
+            sessions.close()
+            with self._stats_lock:
+                self.stats["spilled_sessions"] += sessions.spilled
+
+    def _writer(self):
+        with open(self.output_path, mode='a', encoding='utf-8') as file:
+            pending = 0
+            while True:
+                record = self._results.get()
+                if record is _STOP:
+                    break
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if record.get("error"):
+                    self.stats["errors"] += 1
+                self.stats["processed"] += 1
+                pending += 1
+                if pending >= CHECKPOINT_EVERY:
+                    file.flush()
+                    os.fsync(file.fileno())
+                    pending = 0
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _shard_index(self, session_id: str) -> int:
+        return zlib.crc32(session_id.encode("utf-8")) % self.workers
+
+    def _shard(self, session_id: str) -> queue.Queue:
+        return self._inboxes[self._shard_index(session_id)]
+
+    def _spill_path(self, index: int) -> str:
+        return os.path.join(self._spill_dir, f"worker-{index}.sqlite")
+
+    def _restore_checkpoint(self) -> bytearray:
+        """读取检查点，把各会话最后的快照按分片写入对应工作线程的溢出文件"""
+        spills: Dict[int, sqlite3.Connection] = {}
+
+        def restore(session_id: str, snapshot: Optional[Dict[str, Any]]):
+            index = self._shard_index(session_id)
+            db = spills.get(index)
+            if db is None:
+                db = spills[index] = open_spill(self._spill_path(index))
+            if snapshot is None:
+                db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            else:
+                db.execute(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?)",
+                    (session_id, json.dumps(snapshot, ensure_ascii=False))
+                )
+
+        try:
+            return load_checkpoint(self.output_path, restore)
+        finally:
+            for db in spills.values():
+                db.commit()
+                db.close()
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        self._spill_dir = tempfile.mkdtemp(prefix="batch-sessions-")
+        done = bytearray()
+        try:
+            if self.resume:
+                done = self._restore_checkpoint()
+            elif os.path.exists(self.output_path):
+                os.remove(self.output_path)
+        except BaseException:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            raise
+
+        writer = threading.Thread(target=self._writer, name="batch-writer")
+        workers = [
+            threading.Thread(target=self._worker, args=(i, inbox), name=f"batch-worker-{i}")
+            for i, inbox in enumerate(self._inboxes)
+        ]
+        writer.start()
+        for thread in workers:
+            thread.start()
+
+        try:
+            for line_no, record, error in iter_input(self.input_path):
+                if line_no < len(done) and done[line_no]:
+                    self.stats["skipped"] += 1
+                    continue
+                if error is not None:
+                    self._results.put({"line": line_no, "session_id": None, "error": error, "context": None})
+                    continue
+                session_id = str(record["session_id"])
+                self._shard(session_id).put((line_no, session_id, str(record["utterance"])))
+        finally:
+            for inbox in self._inboxes:
+                inbox.put(_STOP)
+            for thread in workers:
+                thread.join()
+            self._results.put(_STOP)
+            writer.join()
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+        elapsed = time.perf_counter() - start
+        summary = dict(self.stats)
+        summary["elapsed_s"] = elapsed
+        summary["turns_per_s"] = summary["processed"] / elapsed if elapsed > 0 else 0.0
+        if self.nlu_cascade is not None:
+            summary["cascade"] = self.nlu_cascade.get_stats()
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量回放对话记录")
+    parser.add_argument("input", help="输入 JSONL，每行 {session_id, utterance}")
+    parser.add_argument("output", help="输出 JSONL (同时作为检查点)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="工作线程数")
+    parser.add_argument("--resume", action="store_true", help="从已有输出断点续跑")
+    parser.add_argument("--model", default=NLU_MODEL, help="NLU 模型名")
+    parser.add_argument("--cascade", action="store_true", help="使用 lite -> 完整模型的级联策略 (忽略 --model)")
+    parser.add_argument("--dsl-dir", default=DSL_DIR, help="DSL 配置目录")
+    parser.add_argument("--storage", default=DATA_STORAGE, help="DataManager 存储模式")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS_PER_WORKER,
+                        help="每个工作线程常驻内存的会话数，超出时溢出到磁盘")
+    parser.add_argument("--verbose", action="store_true", help="保留解释器的逐轮打印输出")
+    args = parser.parse_args()
+
+    # 解释器逐轮打印大量调试信息，批处理时默认屏蔽
+    sink = contextlib.nullcontext() if args.verbose else open(os.devnull, 'w', encoding='utf-8')
+    with sink as devnull, contextlib.redirect_stdout(devnull or sys.stdout):
+        runner = BatchRunner(
+            args.input, args.output, workers=args.workers, resume=args.resume,
+            dsl_dir=args.dsl_dir, nlu_model=args.model, data_storage=args.storage,
+            cascade=args.cascade, max_sessions=args.max_sessions
+        )
+        summary = runner.run()
+
+    print(f"[批处理] 完成: 处理 {summary['processed']} 轮，跳过 {summary['skipped']} 轮，"
+          f"错误 {summary['errors']} 轮，耗时 {summary['elapsed_s']:.1f}s "
+          f"({summary['turns_per_s']:.1f} 轮/秒)，溢出到磁盘的会话 {summary['spilled_sessions']} 次")
+    if "cascade" in summary:
+        print(f"[批处理] 模型级联: {json.dumps(summary['cascade'], ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
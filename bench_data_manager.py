@@ -0,0 +1,253 @@
+"""DataManager 规模基准：在合成数据上比较各存储模式的加载耗时、内存、查询延迟和写入吞吐。
+
+每个 (规模, 存储模式) 组合在独立子进程中、针对数据集的独立副本运行：RSS 互不干扰，
+写入测试也不会影响后续模式的数据和索引。结果输出为 JSON 报告，不同版本的报告可以直接对比。
+mmap 模式分别测量冷启动 (副本中没有索引，需要构建) 和热启动 (复制预先构建好的索引)。
+
+用法:
+    python bench_data_manager.py --sizes 1000,100000,1000000 --output report.json
+    python bench_data_manager.py --sizes 10000000 --storage compact,mmap-warm --data-root bench_data
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from data_manager import (
+    DataManager, MappedTable, INDEX_SUFFIX, STORAGE_COMPACT, STORAGE_MMAP, STORAGE_ROWS, TABLE_KEYS
+)
+from gen_synthetic_data import generate
+
+# 基准名称 -> (DataManager 存储模式, 副本中是否带上预先构建的索引)
+STORAGE_VARIANTS = {
+    "rows": (STORAGE_ROWS, False),
+    "compact": (STORAGE_COMPACT, False),
+    "mmap-cold": (STORAGE_MMAP, False),
+    "mmap-warm": (STORAGE_MMAP, True),
+}
+DEFAULT_SIZES = [1000, 100000]
+DEFAULT_QUERIES = 1000
+DEFAULT_WRITES = 20
+SAMPLE_KEYS = 10000   # 从 CSV 中抽取用于查询的主键数量上限
+
+
+def rss_mb() -> float:
+    """当前进程的常驻内存 (MB)，优先读取 /proc，其他平台退化为峰值 RSS"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _latency_summary(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def _sample_column(path: str, column: str, limit: int, rng: random.Random) -> List[Any]:
+    """蓄水池抽样：流式读取 CSV，最多保留 limit 行的指定列"""
+    sample = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            value = tuple(row[c] for c in column.split("+")) if "+" in column else row[column]
+            if i < limit:
+                sample.append(value)
+            else:
+                j = rng.randint(0, i)
+                if j < limit:
+                    sample[j] = value
+    return sample
+
+
+def probe(config: Dict[str, Any]) -> Dict[str, Any]:
+    """在当前 (全新) 进程中对一个数据集和存储模式执行全部测量"""
+    rng = random.Random(config["seed"])
+    data_dir = config["data_dir"]
+    queries = config["queries"]
+    writes = config["writes"]
+
+    order_ids = config["order_ids"]
+    product_names = config["product_names"]
+    accounts = config["accounts"]
+
+    baseline = rss_mb()
+    # DataManager 每次写入都会打印日志，测量期间屏蔽
+    load_log = io.StringIO()
+    with contextlib.redirect_stdout(load_log):
+        start = time.perf_counter()
+        manager = DataManager(storage=config["storage"], data_dir=data_dir)
+        manager.preload()
+        load_s = time.perf_counter() - start
+    loaded = rss_mb()
+
+    # 命中和未命中各占一半
+    order_latency = []
+    for i in range(queries):
+        order_id = rng.choice(order_ids) if i % 2 == 0 else f"MISSING{i}"
+        start = time.perf_counter()
+        manager.query_order(order_id)
+        order_latency.append((time.perf_counter() - start) * 1e6)
+
+    product_latency = []
+    for _ in range(queries):
+        name = rng.choice(product_names)
+        start = time.perf_counter()
+        manager.query_product(name)
+        product_latency.append((time.perf_counter() - start) * 1e6)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for i in range(writes):
+            manager.submit_complaint(rng.choice(accounts)[0], f"基准测试投诉 {i}")
+        complaint_s = time.perf_counter() - start
+
+        # 改密码后再改回去，每次写入的行数据量保持一致
+        start = time.perf_counter()
+        for i in range(writes):
+            account_id, password = accounts[i % len(accounts)]
+            manager.change_password(account_id, password, "bench-temp")
+            manager.change_password(account_id, "bench-temp", password)
+        password_s = time.perf_counter() - start
+
+    return {
+        "load_s": load_s,
+        "index_builds": load_log.getvalue().count("构建主键索引"),
+        "rss_mb": loaded,
+        "rss_delta_mb": loaded - baseline,
+        "peak_rss_mb": rss_mb(),
+        "query_order": _latency_summary(order_latency),
+        "query_product": _latency_summary(product_latency),
+        "submit_complaint_ops": writes / complaint_s if complaint_s else 0.0,
+        "change_password_ops": 2 * writes / password_s if password_s else 0.0,
+    }
+
+
+def run_probe(config: Dict[str, Any]) -> Dict[str, Any]:
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--probe"],
+        input=json.dumps(config), capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def prepare_dataset(data_root: str, rows: int, seed: int) -> str:
+    """生成 (或复用已生成的) 指定规模的数据集并构建索引，返回目录路径。该目录只读，探针使用其副本。"""
+    data_dir = os.path.join(data_root, f"orders_{rows}")
+    marker = os.path.join(data_dir, ".complete")
+    if not os.path.exists(marker):
+        print(f"[基准] 生成 {rows} 行订单数据到 {data_dir} ...", file=sys.stderr)
+        generate(data_dir, rows, seed=seed)
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(str(seed))
+    # 索引有效时只是打开再关闭；供 mmap-warm 复制使用，不计入测量
+    with contextlib.redirect_stdout(io.StringIO()):
+        for table, key in TABLE_KEYS.items():
+            MappedTable(os.path.join(data_dir, f"{table}.csv"), key).close()
+    return data_dir
+
+
+def copy_dataset(data_dir: str, with_indexes: bool) -> str:
+    """把数据集复制到同一文件系统下的临时目录。copy2 保留修改时间，复制的索引仍被视为有效。"""
+    work_dir = tempfile.mkdtemp(prefix="probe-", dir=os.path.dirname(os.path.abspath(data_dir)))
+    patterns = ["*.csv"] + ([f"*{INDEX_SUFFIX}"] if with_indexes else [])
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(data_dir, pattern)):
+            shutil.copy2(path, work_dir)
+    return work_dir
+
+
+def run_benchmark(sizes: List[int], variants: List[str], data_root: str, queries: int,
+                  writes: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    results = []
+    for rows in sizes:
+        data_dir = prepare_dataset(data_root, rows, seed)
+        base = {
+            "queries": queries,
+            "writes": writes,
+            "seed": seed,
+            "order_ids": _sample_column(os.path.join(data_dir, "orders.csv"), "order_id", SAMPLE_KEYS, rng),
+            "product_names": _sample_column(os.path.join(data_dir, "products.csv"), "product_name", SAMPLE_KEYS, rng),
+            "accounts": _sample_column(os.path.join(data_dir, "accounts.csv"), "account_id+password", writes, rng),
+        }
+        file_bytes = sum(os.path.getsize(p) for p in glob.glob(os.path.join(data_dir, "*.csv")))
+
+        for variant in variants:
+            storage, with_indexes = STORAGE_VARIANTS[variant]
+            print(f"[基准] rows={rows} storage={variant}", file=sys.stderr)
+            work_dir = copy_dataset(data_dir, with_indexes)
+            try:
+                metrics = run_probe(dict(base, storage=storage, data_dir=work_dir))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            results.append({"rows": rows, "storage": variant, "csv_mb": file_bytes / 1e6, **metrics})
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "queries": queries,
+            "writes": writes,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DataManager 规模基准")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="订单行数列表，逗号分隔")
+    parser.add_argument("--storage", default=",".join(STORAGE_VARIANTS), help="存储模式列表，逗号分隔")
+    parser.add_argument("--data-root", default="bench_data", help="合成数据目录 (按规模缓存复用)")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="每种查询的次数")
+    parser.add_argument("--writes", type=int, default=DEFAULT_WRITES, help="每种写操作的次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON 报告路径 (默认打印到标准输出)")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(probe(json.loads(sys.stdin.read()))))
+        return
+
+    variants = [v.strip() for v in args.storage.split(",") if v.strip()]
+    unknown = [v for v in variants if v not in STORAGE_VARIANTS]
+    if unknown:
+        parser.error(f"未知的存储模式: {unknown}，可选 {list(STORAGE_VARIANTS)}")
+
+    report = run_benchmark(
+        [int(s) for s in args.sizes.split(",")], variants, args.data_root, args.queries, args.writes, args.seed
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
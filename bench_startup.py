@@ -0,0 +1,64 @@
+"""冷启动基准：在全新子进程中测量 import 耗时、InterpreterCore 构造耗时和完整预热耗时。
+
+用法:
+    python bench_startup.py --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 在子进程中执行的测量脚本，结果以一行 JSON 打印到 stdout
+_PROBE = r"""
+import contextlib, io, json, time
+t0 = time.perf_counter()
+import interpreter_core
+t1 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    core = interpreter_core.InterpreterCore(interpreter_core.DSL_DIR, interpreter_core.NLU_MODEL)
+    t2 = time.perf_counter()
+    core.warm_up()
+    t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "construct_ms": (t2 - t1) * 1000,
+    "warm_up_ms": (t3 - t2) * 1000,
+}))
+"""
+
+
+def run_probe() -> dict:
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=root, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="重复次数 (取中位数)")
+    parser.add_argument("--output", help="结果 JSON 输出路径 (默认打印到标准输出)")
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "median": {key: statistics.median(s[key] for s in samples) for key in samples[0]},
+        "samples": samples,
+    }
+    # 首次响应前的关键路径：import + 构造 (预热可在后台进行)
+    report["median"]["first_ready_ms"] = report["median"]["import_ms"] + report["median"]["construct_ms"]
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
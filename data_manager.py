@@ -1,33 +1,472 @@
 import csv
+import functools
+import hashlib
+import mmap
 import os
+import struct
+import sys
+import threading
 import time
-from typing import Dict, Any, List, Optional
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Union
 
 ACCOUNTS_FILE = "./data/accounts.csv"
 ORDERS_FILE = "./data/orders.csv"
 COMPLAINTS_FILE = "./data/complaints.csv"
 PRODUCTS_FILE = "./data/products.csv"
 
-class DataManager:
+# --- 存储模式 ---
+STORAGE_ROWS = "rows"          # 每行一个 dict (默认)
+STORAGE_COMPACT = "compact"    # 列式紧凑存储 (CompactTable)
+STORAGE_MMAP = "mmap"          # 内存映射 + 磁盘偏移索引，按需解析 (MappedTable)
+
+# 旁路索引文件：<csv>.idx，头部记录源文件大小/修改时间用于校验，之后是按哈希排序的 (key_hash, offset) 记录
+INDEX_SUFFIX = ".idx"
+_INDEX_MAGIC = b"DSLIDX1\0"
+_INDEX_HEADER = struct.Struct("<8sQqQ")   # magic, 源文件大小, 源文件 mtime_ns, 记录数
+_INDEX_ENTRY = struct.Struct("<QQ")       # key 哈希, 行起始偏移
+
+# 字典编码列的基数上限，超过后转为紧凑字符串列
+DICT_MAX_CARDINALITY = 1 << 16
+
+# 编码数组按需加宽：B(1字节) -> H(2字节) -> I(4字节)
+_CODE_TYPECODES = (("B", 0xFF), ("H", 0xFFFF), ("I", 0xFFFFFFFF))
+
+
+class _DictColumn:
+    """字典编码列：每个不同的值只驻留一份，行内只保存整数编码。适合 status、product_name 等低基数列。"""
+    __slots__ = ("values", "codes", "_lookup")
+
     def __init__(self):
-        self._data: Dict[str, List[Dict[str, str]]] = {
-            'accounts': self._load_csv(ACCOUNTS_FILE),
-            'orders': self._load_csv(ORDERS_FILE),
-            'complaints': self._load_csv(COMPLAINTS_FILE),
-            'products': self._load_csv(PRODUCTS_FILE)
+        self.values: List[str] = []
+        self.codes = array("B")
+        self._lookup: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _encode(self, value: str) -> int:
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value)
+            self.values.append(value)
+            self._lookup[value] = code
+            for typecode, limit in _CODE_TYPECODES:
+                if code <= limit:
+                    if typecode != self.codes.typecode:
+                        self.codes = array(typecode, self.codes)
+                    break
+        return code
+
+    @property
+    def cardinality(self) -> int:
+        return len(self.values)
+
+    def append(self, value: str):
+        # 先编码再追加：编码过程中 codes 可能被加宽替换
+        code = self._encode(value)
+        self.codes.append(code)
+
+    def get(self, index: int) -> str:
+        return self.values[self.codes[index]]
+
+    def set(self, index: int, value: str):
+        code = self._encode(value)
+        self.codes[index] = code
+
+    def find(self, value: str) -> int:
+        code = self._lookup.get(value)
+        if code is None:
+            return -1
+        try:
+            return self.codes.index(code)
+        except ValueError:
+            return -1
+
+    def take(self, indices: Iterable[int]) -> "_DictColumn":
+        column = _DictColumn()
+        column.values = self.values
+        column._lookup = self._lookup
+        column.codes = array(self.codes.typecode, (self.codes[i] for i in indices))
+        return column
+
+
+class _PackedColumn:
+    """紧凑字符串列：所有值以 UTF-8 连续存放在一个 bytearray 中，配合偏移数组定位。适合 order_id 等高基数列。"""
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.blob = bytearray()
+        self.offsets = array("Q", [0])
+        for value in values:
+            self.append(value)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def append(self, value: str):
+        self.blob += value.encode("utf-8")
+        self.offsets.append(len(self.blob))
+
+    def get(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].decode("utf-8")
+
+    def set(self, index: int, value: str):
+        # 变长写入需要整体平移后续偏移，仅用于低频的更新操作
+        start, end = self.offsets[index], self.offsets[index + 1]
+        encoded = value.encode("utf-8")
+        self.blob[start:end] = encoded
+        delta = len(encoded) - (end - start)
+        if delta:
+            for i in range(index + 1, len(self.offsets)):
+                self.offsets[i] += delta
+
+    def find(self, value: str) -> int:
+        # 直接在字节块中搜索，再用偏移数组校验命中位置恰好是一个完整的值
+        encoded = value.encode("utf-8")
+        pos = self.blob.find(encoded)
+        while pos != -1:
+            index = bisect_left(self.offsets, pos)
+            if (index < len(self) and self.offsets[index] == pos
+                    and self.offsets[index + 1] == pos + len(encoded)):
+                return index
+            pos = self.blob.find(encoded, pos + 1)
+        return -1
+
+    def take(self, indices: Iterable[int]) -> "_PackedColumn":
+        return _PackedColumn(self.get(i) for i in indices)
+
+
+class _RowView(Mapping):
+    """CompactTable 中某一行的只读字典视图 (支持按键赋值以兼容原有的更新逻辑)。
+
+    注意：删除行后已有视图的下标不再有效。
+    """
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "CompactTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> str:
+        column = self._table._columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        return column.get(self._index)
+
+    def __setitem__(self, key: str, value: str):
+        self._table.set_value(self._index, key, value)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.fieldnames)
+
+    def __len__(self) -> int:
+        return len(self._table.fieldnames)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class CompactTable:
+    """列式紧凑表：替代 List[Dict[str, str]]，提供按行下标访问的字典视图。
+
+    每列初始为字典编码列，不同值数量超过 DICT_MAX_CARDINALITY 时自动转为紧凑字符串列。
+    """
+    __slots__ = ("fieldnames", "_columns")
+
+    def __init__(self, fieldnames: List[str]):
+        self.fieldnames = list(fieldnames)
+        self._columns: Dict[str, Union[_DictColumn, _PackedColumn]] = {
+            name: _DictColumn() for name in self.fieldnames
         }
+
+    @classmethod
+    def from_rows(cls, fieldnames: List[str], rows: Iterable[Mapping]) -> "CompactTable":
+        table = cls(fieldnames)
+        for row in rows:
+            table.append(row)
+        return table
+
+    def __len__(self) -> int:
+        if not self.fieldnames:
+            return 0
+        return len(self._columns[self.fieldnames[0]])
+
+    def __getitem__(self, index: int) -> _RowView:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return _RowView(self, index)
+
+    def __iter__(self) -> Iterator[_RowView]:
+        for index in range(len(self)):
+            yield _RowView(self, index)
+
+    def append(self, row: Mapping):
+        for name in self.fieldnames:
+            value = row.get(name)
+            column = self._columns[name]
+            column.append("" if value is None else value)
+            if isinstance(column, _DictColumn) and column.cardinality > DICT_MAX_CARDINALITY:
+                self._columns[name] = _PackedColumn(column.get(i) for i in range(len(column)))
+
+    def set_value(self, index: int, key: str, value: str):
+        column = self._columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        column.set(index, "" if value is None else value)
+
+    def find(self, key: str, value: str) -> int:
+        """返回 key 列中第一个等于 value 的行下标，不存在时返回 -1。"""
+        column = self._columns.get(key)
+        if column is None:
+            return -1
+        return column.find(value)
+
+    def remove_where(self, predicate: Callable[[Mapping], bool]) -> int:
+        """删除所有满足 predicate 的行，返回删除的行数。"""
+        keep = [i for i in range(len(self)) if not predicate(_RowView(self, i))]
+        removed = len(self) - len(keep)
+        if removed:
+            self._columns = {name: column.take(keep) for name, column in self._columns.items()}
+        return removed
+
+
+def _key_hash(key: str) -> int:
+    """稳定的 64 位主键哈希 (不受 PYTHONHASHSEED 影响，可跨进程持久化)。"""
+    return int.from_bytes(hashlib.blake2b(key.strip().encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MappedTable:
+    """内存映射的只读 CSV 表：按主键经旁路索引定位行，只在访问时解析。
+
+    索引文件与 CSV 同目录 (<csv>.idx)，源文件大小或修改时间变化时自动重建。
+    多个工作进程映射同一文件时共享操作系统页缓存。要求每条记录占一行 (字段内不含换行)。
+    """
+
+    def __init__(self, file_path: str, key: str):
+        self.file_path = file_path
+        self.key = key
+        self.index_path = file_path + INDEX_SUFFIX
+
+        self._file = open(file_path, mode='rb')
+        stat = os.fstat(self._file.fileno())
+        self._source_size = stat.st_size
+        self._source_mtime = stat.st_mtime_ns
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else None
+
+        # 解析表头
+        self.fieldnames: List[str] = []
+        self._data_start = 0
+        if self._mm is not None:
+            start = 3 if self._mm[:3] == b"\xef\xbb\xbf" else 0
+            header, self._data_start = self._read_line(start)
+            self.fieldnames = next(csv.reader([header.decode("utf-8")]), [])
+        self._key_index = self.fieldnames.index(key) if key in self.fieldnames else -1
+
+        self._index_file = None
+        self._index: Optional[mmap.mmap] = None
+        self._count = 0
+        if self._mm is not None and self._key_index >= 0:
+            self._open_index()
+
+    # --- 索引 ---
+
+    def _open_index(self):
+        if not self._index_is_current():
+            self._build_index()
+        self._index_file = open(self.index_path, mode='rb')
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._count = _INDEX_HEADER.unpack_from(self._index, 0)[3]
+
+    def _index_is_current(self) -> bool:
+        try:
+            with open(self.index_path, mode='rb') as file:
+                header = file.read(_INDEX_HEADER.size)
+        except OSError:
+            return False
+        if len(header) != _INDEX_HEADER.size:
+            return False
+        magic, size, mtime, _ = _INDEX_HEADER.unpack(header)
+        return magic == _INDEX_MAGIC and size == self._source_size and mtime == self._source_mtime
+
+    def _build_index(self):
+        print(f"[数据索引]: 正在为 {self.file_path} 构建主键索引...")
+        hashes = array("Q")
+        offsets = array("Q")
+        pos = self._data_start
+        while pos < self._source_size:
+            line, next_pos = self._read_line(pos)
+            if line:
+                hashes.append(_key_hash(self._split_line(line)[self._key_index]))
+                offsets.append(pos)
+            pos = next_pos
+
+        # 稳定排序：相同哈希按文件顺序排列，保证返回第一条匹配记录
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode='wb') as file:
+            file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, self._source_size, self._source_mtime, len(order)))
+            for i in order:
+                file.write(_INDEX_ENTRY.pack(hashes[i], offsets[i]))
+        # 原子替换，多个进程并发构建时互不干扰
+        os.replace(tmp_path, self.index_path)
+
+    def _entry(self, i: int):
+        return _INDEX_ENTRY.unpack_from(self._index, _INDEX_HEADER.size + i * _INDEX_ENTRY.size)
+
+    # --- 行解析 ---
+
+    def _read_line(self, pos: int):
+        end = self._mm.find(b"\n", pos)
+        if end == -1:
+            end = self._source_size
+        return self._mm[pos:end].rstrip(b"\r"), end + 1
+
+    def _split_line(self, line: bytes) -> List[str]:
+        text = line.decode("utf-8")
+        if '"' in text:
+            return next(csv.reader([text]), [])
+        return text.split(",")
+
+    def _parse_row(self, line: bytes) -> Dict[str, str]:
+        return dict(zip(self.fieldnames, self._split_line(line)))
+
+    # --- 读取接口 ---
+
+    def lookup(self, key_value: str) -> Optional[Dict[str, str]]:
+        """按主键查找一行，只解析命中的记录。"""
+        if self._index is None:
+            return None
+        target = _key_hash(key_value)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self._count:
+            entry_hash, offset = self._entry(lo)
+            if entry_hash != target:
+                break
+            row = self._parse_row(self._read_line(offset)[0])
+            if row.get(self.key, '').strip() == key_value.strip():
+                return row
+            lo += 1
+        return None
+
+    def __len__(self) -> int:
+        if self._index is not None:
+            return self._count
+        return sum(1 for _ in self)
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        if self._mm is None:
+            return
+        pos = self._data_start
+        while pos < self._source_size:
+            line, pos = self._read_line(pos)
+            if line:
+                yield self._parse_row(line)
+
+    def close(self):
+        for handle in (self._index, self._index_file, self._mm, self._file):
+            if handle is not None:
+                handle.close()
+        self._index = self._index_file = self._mm = None
+
+
+TableData = Union[List[Dict[str, str]], CompactTable, MappedTable]
+
+
+# 表名 -> 主键列
+TABLE_KEYS: Dict[str, str] = {
+    'accounts': 'account_id',
+    'orders': 'order_id',
+    'complaints': 'ref_id',
+    'products': 'product_name',
+}
+
+
+class _LazyTables(dict):
+    """表名 -> 表数据的字典，首次访问某张表时才调用 loader 加载。"""
+
+    def __init__(self, loader: Callable[[str], TableData]):
+        super().__init__()
+        self._loader = loader
+
+    def __missing__(self, table: str) -> TableData:
+        if table not in TABLE_KEYS:
+            raise KeyError(table)
+        return self._loader(table)
+
+
+def _synchronized(method):
+    """写操作加锁：批处理时多个会话线程共享同一个 DataManager。"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class DataManager:
+    def __init__(self, storage: str = STORAGE_ROWS, preload: bool = False, data_dir: Optional[str] = None):
+        self.storage = storage
+        # 指定 data_dir 时从该目录读写同名 CSV (用于基准测试等场景)，否则使用默认路径
+        self.data_dir = data_dir
+        self._lock = threading.RLock()
+        # 各表在首次访问时加载，只服务单一领域的进程不会读取无关的 CSV
+        self._data: Dict[str, TableData] = _LazyTables(self._load_table)
+        if preload:
+            self.preload()
+
+    def _load_table(self, table: str) -> TableData:
+        with self._lock:
+            if table not in self._data:
+                self._data[table] = self._load_csv(self._table_path(table), key=TABLE_KEYS[table])
+            return self._data[table]
+
+    def _table_path(self, table: str) -> str:
+        file_path = {
+            'accounts': ACCOUNTS_FILE,
+            'orders': ORDERS_FILE,
+            'complaints': COMPLAINTS_FILE,
+            'products': PRODUCTS_FILE,
+        }[table]
+        if self.data_dir is not None:
+            file_path = os.path.join(self.data_dir, os.path.basename(file_path))
+        return file_path
+
+    def preload(self):
+        """加载全部表 (用于后台预热)。"""
+        for table in TABLE_KEYS:
+            self._data[table]
         print("--- DataManager: CSV 数据加载完成 ---")
 
-    def _load_csv(self, file_path: str) -> List[Dict[str, str]]:
-        """从 CSV 文件加载数据到内存中。"""
+    def _load_csv(self, file_path: str, key: Optional[str] = None) -> TableData:
+        """从 CSV 文件加载数据到内存中 (mmap 模式下仅建立映射，不解析)。"""
         if not os.path.exists(file_path):
             print(f"警告: 文件 {file_path} 不存在，初始化为空列表。")
             return []
         
         data = []
         try:
+            if self.storage == STORAGE_MMAP:
+                return MappedTable(file_path, key)
             with open(file_path, mode='r', encoding='utf-8') as file:
                 reader = csv.DictReader(file)
+                if self.storage == STORAGE_COMPACT:
+                    # 主键列去掉首尾空白：列内查找是精确匹配，这样与行式表/映射表 strip 后比较的结果一致
+                    rows = reader if key is None else ({**row, key: (row.get(key) or '').strip()} for row in reader)
+                    return CompactTable.from_rows(reader.fieldnames or [], rows)
                 for row in reader:
                     data.append(dict(row))
         except Exception as e:
@@ -35,33 +474,68 @@ class DataManager:
             return []
         return data
 
-    def _save_csv(self, file_path: str, data: List[Dict[str, str]]):
+    def _find_row(self, table: str, key: str, value: str) -> Optional[Mapping]:
+        """按列值精确查找第一行，列式表走列内查找，行式表逐行比较。"""
+        data = self._data[table]
+        if isinstance(data, CompactTable):
+            index = data.find(key, value)
+            return data[index] if index >= 0 else None
+        if isinstance(data, MappedTable) and data.key == key:
+            return data.lookup(value)
+        for row in data:
+            # 兼容性匹配：移除订单号中的空格或尝试进行简单匹配
+            if row.get(key, '').strip() == value:
+                return row
+        return None
+
+    def _mutable(self, table: str) -> TableData:
+        """返回可修改的表。映射表是只读的，首次写入时整体物化为内存行列表。"""
+        data = self._data[table]
+        if isinstance(data, MappedTable):
+            rows = list(data)
+            data.close()
+            self._data[table] = data = rows
+        return data
+
+    def _remove_rows(self, table: str, predicate: Callable[[Mapping], bool]):
+        data = self._mutable(table)
+        if isinstance(data, CompactTable):
+            data.remove_where(predicate)
+        else:
+            self._data[table] = [row for row in data if not predicate(row)]
+
+    def _save_csv(self, file_path: str, data: TableData):
         if not data:
             return
             
         fieldnames = list(data[0].keys())
+        # 先写同目录下的临时文件再原子替换：其他进程已映射的旧文件 (旧 inode) 保持完整，
+        # 不会读到截断后的内容；新文件的大小/mtime 变化会让对应的 .idx 索引按过期处理并重建
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
         try:
-            with open(file_path, mode='w', encoding='utf-8', newline='') as file:
+            with open(tmp_path, mode='w', encoding='utf-8', newline='') as file:
                 writer = csv.DictWriter(file, fieldnames=fieldnames)
                 writer.writeheader()
                 writer.writerows(data)
+            os.replace(tmp_path, file_path)
             print(f"[数据操作]: 成功保存数据到 {file_path}")
         except Exception as e:
             print(f"错误: 写入 {file_path} 失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     # --- DSL 核心动作函数 ---
 
     def query_order(self, order_id: str) -> Optional[Dict[str, str]]:
         """根据 order_id 查询订单信息。"""
-        for order in self._data['orders']:
-            # 兼容性匹配：移除订单号中的空格或尝试进行简单匹配
-            if order.get('order_id', '').strip() == order_id.strip():
-                return {
-                    'status': order['status'],
-                    'eta': order['eta'],
-                    'product_name': order['product_name']
-                }
-        return None
+        order = self._find_row('orders', 'order_id', order_id.strip())
+        if order is None:
+            return None
+        return {
+            'status': order['status'],
+            'eta': order['eta'],
+            'product_name': order['product_name']
+        }
 
     def query_product(self, product_name: str) -> Optional[Dict[str, str]]:
         """根据 product_name 查询商品信息。"""
@@ -69,9 +543,10 @@ class DataManager:
         
         for product in self._data['products']:
             if search_name_lower in product.get('product_name', '').lower():
-                return product
+                return dict(product)
         return None
 
+    @_synchronized
     def submit_complaint(self, account_id: str, issue_description: str) -> Dict[str, Any]:
         """模拟提交投诉记录。"""
         new_ref_id = f"C{int(time.time())}"
@@ -80,15 +555,17 @@ class DataManager:
             'account_id': account_id if account_id else "Guest",
             'issue_description': issue_description
         }
-        self._data['complaints'].append(new_complaint)
-        self._save_csv(COMPLAINTS_FILE, self._data['complaints'])
+        complaints = self._mutable('complaints')
+        complaints.append(new_complaint)
+        self._save_csv(self._table_path('complaints'), complaints)
         return {'ref_id': new_ref_id}
 
+    @_synchronized
     def change_password(self, account_id: str, old_password: str, new_password: str) -> bool:
         """模拟修改账户密码。"""
         found = False
         success = False
-        for account in self._data['accounts']:
+        for account in self._mutable('accounts'):
             if account.get('account_id') == account_id:
                 found = True
                 if account.get('password') == old_password:
@@ -99,10 +576,11 @@ class DataManager:
                     success = False
                     break
         if success:
-            self._save_csv(ACCOUNTS_FILE, self._data['accounts'])
+            self._save_csv(self._table_path('accounts'), self._data['accounts'])
             return True
         return False
         
+    @_synchronized
     def deactivate_account(self, account_id: str, old_password: str) -> bool:
         """模拟注销账户。"""
         found_and_matched = False
@@ -115,11 +593,8 @@ class DataManager:
 
         if found_and_matched:
             # 移除账户
-            self._data['accounts'] = [
-                account for account in self._data['accounts'] 
-                if account.get('account_id') != account_id
-            ]
-            self._save_csv(ACCOUNTS_FILE, self._data['accounts'])
+            self._remove_rows('accounts', lambda account: account.get('account_id') == account_id)
+            self._save_csv(self._table_path('accounts'), self._data['accounts'])
             return True
         
         return False
\ No newline at end of file
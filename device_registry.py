@@ -0,0 +1,352 @@
+"""智能家居设备注册表：为 Smart_Home 的 DeviceAPI / SceneAPI 动作提供设备状态和指令下发。
+
+- 设备状态常驻内存 (每台设备一个 dict，与 DataManager 的行格式一致)，指令成功后写回 data/devices.csv。
+- 场景定义在 data/scenes.csv，每行一个步骤。激活场景时按设备分组并发下发：同一设备的步骤按顺序执行，
+  不同设备之间并行；每台设备有独立的超时，部分设备失败时报告成功/失败明细，成功设备的状态照常更新。
+- 指令下发：默认在进程内直接生效；设置环境变量 DEVICE_ENDPOINT 后通过 HTTP 发送到设备网关
+  (可用 device_sim_server.py 模拟)，连接池在请求间复用。
+
+用法 (基准：启动一个模拟设备服务器，测量场景并发下发的延迟和吞吐):
+    python device_registry.py --devices 200 --activations 20 --latency-ms 50 --failure-rate 0.02
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+DEVICES_FILE = "./data/devices.csv"
+SCENES_FILE = "./data/scenes.csv"
+DEVICE_FIELDS = ["device_id", "name", "device_type", "room", "power", "temperature"]
+
+DEVICE_TIMEOUT = 2.0        # 单台设备单条指令的超时 (秒)
+FANOUT_WORKERS = 32         # 场景下发的并发线程数
+TEMPERATURE_RANGE = (16.0, 30.0)
+TEMPERATURE_TYPES = ("thermostat",)   # 支持设置温度的设备类型
+
+DEVICE_COMMANDS = ("turnOn", "turnOff", "setTemperature")
+POWER_LABELS = {"on": "开启", "off": "关闭"}
+
+
+def _parse_temperature(value: Any) -> Optional[float]:
+    match = re.search(r"-?\d+(\.\d+)?", str(value or ""))
+    return float(match.group()) if match else None
+
+
+class LocalDeviceTransport:
+    """进程内直接生效，未配置设备网关时使用"""
+
+    def send(self, device_id: str, command: str, value: Any = None):
+        return None
+
+    def close(self):
+        pass
+
+
+class HTTPDeviceTransport:
+    """通过 HTTP 把指令发送到设备网关：POST {base_url}/devices/<device_id>/<command>"""
+
+    def __init__(self, base_url: str, timeout: float = DEVICE_TIMEOUT, max_connections: int = FANOUT_WORKERS):
+        import httpx
+
+        self._timeout_error = httpx.TimeoutException
+        self.timeout = timeout
+        self.client = httpx.Client(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def send(self, device_id: str, command: str, value: Any = None):
+        try:
+            response = self.client.post(f"/devices/{device_id}/{command}", json={"value": value})
+        except self._timeout_error:
+            raise TimeoutError(f"响应超时 ({self.timeout:g}s)")
+        if response.status_code != 200:
+            raise RuntimeError(f"设备返回 HTTP {response.status_code}")
+
+    def close(self):
+        self.client.close()
+
+
+class DeviceRegistry:
+    def __init__(self, devices_file: Optional[str] = DEVICES_FILE, scenes_file: Optional[str] = SCENES_FILE,
+                 transport=None, workers: int = FANOUT_WORKERS, device_timeout: float = DEVICE_TIMEOUT):
+        # devices_file 为 None 时不持久化 (用于基准测试)
+        self.devices_file = devices_file
+        self.transport = transport or LocalDeviceTransport()
+        self.workers = workers
+        self.device_timeout = device_timeout
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.scenes: Dict[str, List[Tuple[str, str, Optional[str]]]] = {}
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()   # 串行化写盘，保证最后替换进去的是最新的状态
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        if devices_file and os.path.exists(devices_file):
+            for row in self._read_csv(devices_file):
+                self.add_device(**{field: row.get(field, "") for field in DEVICE_FIELDS})
+        if scenes_file and os.path.exists(scenes_file):
+            for row in self._read_csv(scenes_file):
+                self.scenes.setdefault(row['scene_name'], []).append(
+                    (row['device_id'], row['command'], row.get('value') or None)
+                )
+
+    @staticmethod
+    def _read_csv(file_path: str) -> List[Dict[str, str]]:
+        with open(file_path, mode='r', encoding='utf-8', newline='') as file:
+            return list(csv.DictReader(file))
+
+    def save(self):
+        if not self.devices_file:
+            return
+        # 与 DataManager._save_csv 相同：先写临时文件再原子替换，读者和崩溃都不会留下写了一半的文件
+        tmp_path = f"{self.devices_file}.{os.getpid()}.tmp"
+        with self._save_lock:
+            with self._lock:
+                rows = [{field: device[field] for field in DEVICE_FIELDS} for device in self.devices.values()]
+            try:
+                with open(tmp_path, mode='w', encoding='utf-8', newline='') as file:
+                    writer = csv.DictWriter(file, fieldnames=DEVICE_FIELDS)
+                    writer.writeheader()
+                    writer.writerows(rows)
+                os.replace(tmp_path, self.devices_file)
+                print(f"[数据操作]: 成功保存设备状态到 {self.devices_file}")
+            except Exception as e:
+                print(f"错误: 写入 {self.devices_file} 失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def add_device(self, device_id: str, name: str, device_type: str, room: str = "",
+                   power: str = "off", temperature: Any = ""):
+        with self._lock:
+            self.devices[device_id] = {
+                "device_id": device_id, "name": name, "device_type": device_type, "room": room,
+                "power": power or "off", "temperature": temperature, "online": True, "last_error": None,
+            }
+
+    def define_scene(self, scene_name: str, steps: List[Tuple[str, str, Optional[str]]]):
+        with self._lock:
+            self.scenes[scene_name] = list(steps)
+
+    def find_device(self, device_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """按 device_id、名称精确匹配，再按名称包含关系模糊匹配 (如 "灯" -> "客厅灯")"""
+        if not device_name:
+            return None
+        device_name = str(device_name).strip()
+        with self._lock:
+            if device_name in self.devices:
+                return self.devices[device_name]
+            for device in self.devices.values():
+                if device["name"] == device_name:
+                    return device
+            for device in self.devices.values():
+                if device["name"] in device_name or device_name in device["name"]:
+                    return device
+        return None
+
+    def find_scene(self, scene_name: Optional[str]) -> Optional[str]:
+        if not scene_name:
+            return None
+        scene_name = str(scene_name).strip()
+        if scene_name in self.scenes:
+            return scene_name
+        for name in self.scenes:
+            if name in scene_name or scene_name in name:
+                return name
+        return None
+
+    def _send(self, device: Dict[str, Any], command: str, value: Any = None):
+        """校验 -> 下发 -> 成功后更新内存状态；失败时抛出异常，消息直接展示给用户"""
+        if command not in DEVICE_COMMANDS:
+            raise ValueError(f"不支持的指令 {command}")
+        temperature = None
+        if command == "setTemperature":
+            if device["device_type"] not in TEMPERATURE_TYPES:
+                raise ValueError(f"{device['name']} 不支持设置温度")
+            temperature = _parse_temperature(value)
+            if temperature is None or not TEMPERATURE_RANGE[0] <= temperature <= TEMPERATURE_RANGE[1]:
+                raise ValueError(f"温度需在 {TEMPERATURE_RANGE[0]:g}~{TEMPERATURE_RANGE[1]:g} 度之间")
+
+        try:
+            self.transport.send(device["device_id"], command, temperature)
+        except Exception as e:
+            with self._lock:
+                device["online"] = False
+                device["last_error"] = str(e)
+            raise
+
+        with self._lock:
+            device["online"] = True
+            device["last_error"] = None
+            device["power"] = "off" if command == "turnOff" else "on"
+            if temperature is not None:
+                device["temperature"] = f"{temperature:g}"
+
+    # --- DSL 核心动作函数 ---
+
+    def execute(self, device_name: str, command: str, value: Any = None) -> Dict[str, Any]:
+        device = self.find_device(device_name)
+        if device is None:
+            raise ValueError(f"未找到设备 {device_name}")
+        self._send(device, command, value)
+        self.save()
+        return self.describe(device)
+
+    def query_status(self, device_name: str) -> Optional[Dict[str, Any]]:
+        device = self.find_device(device_name)
+        return self.describe(device) if device is not None else None
+
+    def describe(self, device: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            details = []
+            if device["room"]:
+                details.append(f"位于{device['room']}")
+            if device["device_type"] in TEMPERATURE_TYPES and device["temperature"] not in ("", None):
+                details.append(f"设定温度 {device['temperature']} 度")
+            details.append("在线" if device["online"] else f"离线 ({device['last_error']})")
+            return {
+                "device_id": device["device_id"],
+                "status": POWER_LABELS.get(device["power"], device["power"]),
+                "detail": "，".join(details),
+            }
+
+    def _run_device_steps(self, device: Dict[str, Any], steps: List[Tuple[str, Optional[str]]]):
+        for command, value in steps:
+            self._send(device, command, value)
+
+    def activate_scene(self, scene_name: str) -> Optional[Dict[str, Any]]:
+        """并发下发场景中的全部步骤，返回 {scene, total, succeeded, failed, elapsed_ms}；场景不存在时返回 None。
+
+        succeeded 为 device_id 列表，failed 为 {device_id: 失败原因}；设备名称可能重复，展示时再按 device_id 查找。
+        """
+        name = self.find_scene(scene_name)
+        if name is None:
+            return None
+        start = time.perf_counter()
+
+        by_device: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        failed: Dict[str, str] = {}
+        for device_id, command, value in self.scenes[name]:
+            if device_id not in self.devices:
+                failed[device_id] = "设备未注册"
+                continue
+            by_device.setdefault(device_id, []).append((command, value))
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scene")
+        total = len(by_device) + len(failed)
+        futures = {
+            self._executor.submit(self._run_device_steps, self.devices[device_id], steps): device_id
+            for device_id, steps in by_device.items()
+        }
+        # 传输层保证单条指令不超过 device_timeout；这里按 排队轮数 x 最长步骤数 兜底，超出的设备记为超时
+        # (仍在执行的指令无法中断，若之后成功，其状态照常更新)
+        max_steps = max((len(steps) for steps in by_device.values()), default=0)
+        waves = -(-len(futures) // self.workers)
+        done, not_done = wait(futures, timeout=self.device_timeout * max_steps * waves + 1.0)
+
+        succeeded = []
+        for future in done:
+            device_id = futures[future]
+            error = future.exception()
+            if error is None:
+                succeeded.append(device_id)
+            else:
+                failed[device_id] = str(error) or type(error).__name__
+        for future in not_done:
+            future.cancel()
+            failed[futures[future]] = "超时"
+
+        if succeeded:
+            self.save()
+        return {
+            "scene": name,
+            "total": total,
+            "succeeded": sorted(succeeded),
+            "failed": failed,
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    def device_label(self, device_id: str) -> str:
+        """用于展示的设备名称，未注册的设备返回 device_id"""
+        device = self.devices.get(device_id)
+        return device["name"] if device is not None else device_id
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.transport.close()
+
+
+# 进程内共享的注册表 (首次执行设备动作时创建)
+_registry: Optional[DeviceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> DeviceRegistry:
+    """返回共享的设备注册表；设置了 DEVICE_ENDPOINT 时通过 HTTP 下发指令"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                endpoint = os.environ.get("DEVICE_ENDPOINT")
+                transport = HTTPDeviceTransport(endpoint) if endpoint else None
+                _registry = DeviceRegistry(transport=transport)
+    return _registry
+
+
+def main():
+    from device_sim_server import start_server
+
+    parser = argparse.ArgumentParser(description="场景并发下发基准 (使用本地模拟设备服务器)")
+    parser.add_argument("--devices", type=int, default=200, help="场景中的设备数")
+    parser.add_argument("--activations", type=int, default=20, help="场景激活次数")
+    parser.add_argument("--workers", type=int, default=FANOUT_WORKERS, help="并发下发线程数")
+    parser.add_argument("--timeout", type=float, default=DEVICE_TIMEOUT, help="单台设备超时 (秒)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="模拟设备延迟")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="模拟设备延迟抖动")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟设备返回错误的概率")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="模拟设备挂起的概率")
+    args = parser.parse_args()
+
+    server = start_server(0, args.latency_ms, args.jitter_ms, args.failure_rate, args.hang_rate,
+                          hang_ms=args.timeout * 3000)
+    transport = HTTPDeviceTransport(f"http://127.0.0.1:{server.server_address[1]}", timeout=args.timeout,
+                                    max_connections=args.workers)
+    registry = DeviceRegistry(None, None, transport=transport, workers=args.workers, device_timeout=args.timeout)
+    for i in range(args.devices):
+        registry.add_device(f"dev{i:05d}", f"设备{i}", "thermostat", temperature="24")
+    registry.define_scene("基准场景", [(f"dev{i:05d}", "setTemperature", "24") for i in range(args.devices)])
+
+    latencies = []
+    failures = 0
+    for _ in range(args.activations):
+        report = registry.activate_scene("基准场景")
+        latencies.append(report["elapsed_ms"])
+        failures += len(report["failed"])
+    registry.close()
+    server.shutdown()
+
+    total_commands = args.devices * args.activations
+    print(json.dumps({
+        "devices": args.devices,
+        "workers": args.workers,
+        "activations": args.activations,
+        "scene_p50_ms": statistics.median(latencies),
+        "scene_max_ms": max(latencies),
+        "commands_per_s": total_commands / (sum(latencies) / 1000),
+        "failed_commands": failures,
+        "server": server.stats(),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
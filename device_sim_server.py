@@ -0,0 +1,166 @@
+"""本地模拟设备服务器，用于测试 DeviceRegistry 的 HTTP 下发、超时和场景并发下发吞吐。
+
+- POST /devices/<device_id>/<command>：body 为 {"value": ...}，按配置的延迟返回；
+  以 --failure-rate 的概率返回 503，以 --hang-rate 的概率挂起 --hang-ms 毫秒 (触发调用方超时)
+- GET /devices/<device_id>：返回服务器记录的设备状态
+- GET /stats：返回请求数、失败数、挂起数和峰值并发数
+
+用法:
+    python device_sim_server.py --port 18180 --latency-ms 30 --failure-rate 0.05
+    DEVICE_ENDPOINT=http://127.0.0.1:18180 python interpreter_core.py
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+
+class DeviceSimServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, latency_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0,
+                 hang_rate: float = 0.0, hang_ms: float = 10000.0):
+        super().__init__(("127.0.0.1", port), _DeviceHandler)
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang = hang_ms / 1000.0
+        self.lock = threading.Lock()
+        self.states: Dict[str, Dict[str, Any]] = {}
+        self.total = 0
+        self.failures = 0
+        self.hangs = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def handle_error(self, request, client_address):
+        # 挂起的请求在调用方超时断开后再写回会失败，属于预期情况
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def begin(self):
+        with self.lock:
+            self.total += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "port": self.server_address[1],
+                "total": self.total,
+                "failures": self.failures,
+                "hangs": self.hangs,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "devices": len(self.states),
+            }
+
+
+class _DeviceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # 支持 keep-alive，连接在请求间复用
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["stats"]:
+            self._send_json(200, self.server.stats())
+        elif len(parts) == 2 and parts[0] == "devices":
+            with self.server.lock:
+                state = dict(self.server.states.get(parts[1], {}))
+            self._send_json(200, {"device_id": parts[1], **state})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "devices":
+            self._send_json(404, {"error": "not found"})
+            return
+        device_id, command = parts[1], parts[2]
+
+        server = self.server
+        server.begin()
+        try:
+            roll = random.random()
+            if roll < server.hang_rate:
+                with server.lock:
+                    server.hangs += 1
+                time.sleep(server.hang)
+            elif server.latency or server.jitter:
+                time.sleep(server.latency + random.uniform(0.0, server.jitter))
+
+            if server.hang_rate <= roll < server.hang_rate + server.failure_rate:
+                with server.lock:
+                    server.failures += 1
+                self._send_json(503, {"error": "device unavailable"})
+                return
+
+            with server.lock:
+                state = server.states.setdefault(device_id, {"power": "off"})
+                if command == "turnOn":
+                    state["power"] = "on"
+                elif command == "turnOff":
+                    state["power"] = "off"
+                elif command == "setTemperature":
+                    state["power"] = "on"
+                    state["temperature"] = request.get("value")
+                state = dict(state)
+            self._send_json(200, {"device_id": device_id, **state})
+        finally:
+            server.done()
+
+
+def start_server(port: int, latency_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0,
+                 hang_rate: float = 0.0, hang_ms: float = 10000.0) -> DeviceSimServer:
+    """在后台线程启动模拟设备服务器 (port 为 0 时由系统分配端口)"""
+    server = DeviceSimServer(port, latency_ms=latency_ms, jitter_ms=jitter_ms, failure_rate=failure_rate,
+                             hang_rate=hang_rate, hang_ms=hang_ms)
+    threading.Thread(target=server.serve_forever, name=f"device-sim-{server.server_address[1]}", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟设备服务器")
+    parser.add_argument("--port", type=int, default=18180, help="监听端口")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="每个指令的模拟延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="在延迟之上叠加的随机抖动上限")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="挂起 (不及时响应) 的概率")
+    parser.add_argument("--hang-ms", type=float, default=10000.0, help="挂起时长")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency_ms, args.jitter_ms, args.failure_rate, args.hang_rate, args.hang_ms)
+    print("模拟设备服务器已启动，可使用以下配置：")
+    print(f"DEVICE_ENDPOINT=http://127.0.0.1:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
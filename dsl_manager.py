@@ -1,5 +1,6 @@
 import yaml
 import os
+import threading
 from typing import Dict, Any
 
 # 定义领域到文件的映射
@@ -12,28 +13,50 @@ DSL_FILES: Dict[str, str] = {
 class DSLManager:
     """管理所有领域DSL配置和当前对话状态"""
     
-    def __init__(self, dsl_dir: str = "yaml"):
+    def __init__(self, dsl_dir: str = "yaml", preload: bool = False):
         self.dsl_dir = dsl_dir
         self.configs: Dict[str, Dict[str, Any]] = {}
-        self._load_all_dsls()
+        # 已尝试加载的领域 (包括加载失败的)，避免重复读取
+        self._attempted = set()
+        self._lock = threading.Lock()
+        if preload:
+            self._load_all_dsls()
         
     def _load_all_dsls(self):
         """加载所有 DSL 配置文件"""
         print("--- 正在加载 DSL 配置 ---")
-        for domain, filename in DSL_FILES.items():
-            filepath = os.path.join(self.dsl_dir, filename)
+        for domain in DSL_FILES:
+            self._load_dsl(domain)
+        print("--------------------------")
+
+    def _load_dsl(self, domain: str):
+        """加载单个领域的 DSL 配置文件 (首次使用该领域时调用)"""
+        with self._lock:
+            if domain in self._attempted:
+                return
+            filename = DSL_FILES.get(domain)
+            filepath = os.path.join(self.dsl_dir, filename) if filename else None
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    self.configs[domain] = yaml.safe_load(f)
-                print(f"成功加载 DSL: {domain} ({filename})")
+                if filepath is not None:
+                    with open(filepath, 'r', encoding='utf-8') as f:
+                        self.configs[domain] = yaml.safe_load(f)
+                    print(f"成功加载 DSL: {domain} ({filename})")
             except FileNotFoundError:
                 print(f"警告: 找不到 DSL 文件: {filepath}")
             except yaml.YAMLError as e:
                 print(f"错误: 解析 DSL 文件失败 ({filename}): {e}")
-        print("--------------------------")
+            finally:
+                # 加载完成后才标记，其他线程在此之前会阻塞在锁上而不是读到空配置
+                self._attempted.add(domain)
+
+    def preload(self):
+        """预加载全部领域配置 (用于后台预热)"""
+        self._load_all_dsls()
 
     def get_config(self, domain: str) -> Dict[str, Any]:
-        """根据领域名称获取 DSL 配置"""
+        """根据领域名称获取 DSL 配置，首次访问时加载"""
+        if domain not in self._attempted:
+            self._load_dsl(domain)
         return self.configs.get(domain, {})
 
     def get_initial_state(self, domain: str) -> str:
@@ -0,0 +1,140 @@
+"""合成数据生成器：按指定规模生成与 data/ 目录同结构的 accounts/orders/products/complaints CSV。
+
+商品名由 品牌 + 品类 + 型号后缀 组合而成 (中文为主)，订单按近似 Zipf 分布引用商品，
+状态取值与样例数据一致，可用于 DataManager 的规模测试。
+
+用法:
+    python gen_synthetic_data.py --out bench_data/1m --orders 1000000
+    python gen_synthetic_data.py --out bench_data/10m --orders 10000000 --seed 7
+"""
+import argparse
+import csv
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+BRANDS = ["华为", "小米", "联想", "海尔", "美的", "格力", "索尼", "苹果", "荣耀", "大疆", "戴森", "飞利浦", "九阳", "科沃斯", "漫步者"]
+CATEGORIES = [
+    "智能手机", "平板电脑", "智能手表", "蓝牙耳机", "笔记本电脑", "电子阅读器", "扫地机器人", "空气净化器",
+    "电饭煲", "智能音箱", "充电器", "外置硬盘", "游戏手柄", "打印机", "手机壳", "智能家居设备", "吹风机", "显示器",
+]
+SUFFIXES = ["", "Pro", "Max", "Lite", "X", "青春版", "旗舰版", "标准版", "S", "Plus", "Mini", "Ultra"]
+DESCRIPTIONS = ["高性能旗舰", "降噪效果极佳", "轻薄便携，适合办公", "健康监测功能强大", "续航持久", "性价比之选", "年度新品", "静音节能"]
+ORDER_STATUSES = ["已发货", "等待揽收", "交易失败", "运输中", "已签收"]
+ORDER_STATUS_WEIGHTS = [40, 20, 10, 20, 10]
+STOCK_STATES = ["有货", "缺货", "预售"]
+COMPLAINT_TEMPLATES = [
+    "物流太慢，超过承诺时间。", "商品有轻微划痕，要求换货。", "质量差", "客服态度不好", "收到的{p}无法开机",
+    "{p}与描述不符", "发票一直没有开", "退款迟迟未到账", "{p}包装破损", "配送员未经同意放在门口",
+]
+
+# 未显式指定时，其余各表相对订单数的规模
+DEFAULT_RATIOS = {"accounts": 0.1, "products": 0.001, "complaints": 0.02}
+MIN_PRODUCTS = 50
+
+
+def _account_id(n: int) -> str:
+    return f"user{100000 + n}"
+
+
+def product_names(count: int, rng: random.Random) -> List[str]:
+    """生成 count 个不重复的商品名；组合空间用尽后追加数字型号"""
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = f"{rng.choice(BRANDS)}{rng.choice(CATEGORIES)}{rng.choice(SUFFIXES)}"
+        if name in seen:
+            name = f"{name}{rng.randint(2, 9999)}"
+            if name in seen:
+                continue
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _write_csv(path: str, header: List[str], rows) -> int:
+    count = 0
+    with open(path, mode='w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def generate(out_dir: str, orders: int, accounts: Optional[int] = None, products: Optional[int] = None,
+             complaints: Optional[int] = None, seed: int = 42) -> Dict[str, int]:
+    """生成全部四张表，返回各表的实际行数"""
+    rng = random.Random(seed)
+    accounts = accounts if accounts is not None else max(1, int(orders * DEFAULT_RATIOS["accounts"]))
+    products = products if products is not None else max(MIN_PRODUCTS, int(orders * DEFAULT_RATIOS["products"]))
+    complaints = complaints if complaints is not None else max(1, int(orders * DEFAULT_RATIOS["complaints"]))
+    os.makedirs(out_dir, exist_ok=True)
+
+    names = product_names(products, rng)
+    # 近似 Zipf：少数热门商品占据大部分订单
+    weights = [1.0 / (rank + 1) for rank in range(len(names))]
+    cumulative = []
+    total = 0.0
+    for w in weights:
+        total += w
+        cumulative.append(total)
+
+    base_date = date(2025, 1, 1)
+
+    counts = {}
+    counts["products"] = _write_csv(
+        os.path.join(out_dir, "products.csv"),
+        ["product_name", "price", "stock", "description"],
+        ([name, rng.randint(19, 19999), rng.choice(STOCK_STATES), rng.choice(DESCRIPTIONS)] for name in names),
+    )
+    counts["accounts"] = _write_csv(
+        os.path.join(out_dir, "accounts.csv"),
+        ["account_id", "password"],
+        ([_account_id(i), f"{rng.randint(0, 999999):06d}"] for i in range(accounts)),
+    )
+    counts["orders"] = _write_csv(
+        os.path.join(out_dir, "orders.csv"),
+        ["order_id", "product_name", "status", "eta"],
+        (
+            [
+                f"O{20240000000 + i}",
+                rng.choices(names, cum_weights=cumulative)[0],
+                rng.choices(ORDER_STATUSES, weights=ORDER_STATUS_WEIGHTS)[0],
+                (base_date + timedelta(days=rng.randint(0, 730))).isoformat(),
+            ]
+            for i in range(orders)
+        ),
+    )
+    counts["complaints"] = _write_csv(
+        os.path.join(out_dir, "complaints.csv"),
+        ["ref_id", "account_id", "issue_description"],
+        (
+            [f"C{90000000 + i}", _account_id(rng.randrange(accounts)),
+             rng.choice(COMPLAINT_TEMPLATES).format(p=rng.choice(names))]
+            for i in range(complaints)
+        ),
+    )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成 DataManager 规模测试用的合成 CSV 数据")
+    parser.add_argument("--out", required=True, help="输出目录")
+    parser.add_argument("--orders", type=int, default=1000, help="订单行数 (1K ~ 10M)")
+    parser.add_argument("--accounts", type=int, help=f"账户行数 (默认订单数 x {DEFAULT_RATIOS['accounts']})")
+    parser.add_argument("--products", type=int, help=f"商品行数 (默认订单数 x {DEFAULT_RATIOS['products']}，至少 {MIN_PRODUCTS})")
+    parser.add_argument("--complaints", type=int, help=f"投诉行数 (默认订单数 x {DEFAULT_RATIOS['complaints']})")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，相同参数生成相同数据")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.out, args.orders, args.accounts, args.products, args.complaints, args.seed)
+    print(f"已生成 {args.out}: {counts} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,131 +1,27 @@
-import json
+import copy
 import time
-import os
-import csv
-from typing import Dict, List, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 
 # --- 导入依赖 ---
-from nlu_engine import recognize_intent, recognize_domain
+from nlu_engine import recognize_intent, recognize_domain, get_client, NLUCascade, LITE_MODEL
 from dsl_manager import DSLManager
+from data_manager import DataManager, STORAGE_COMPACT, STORAGE_ROWS
 # from dsl_parser import DSL_Parser # 不再使用
 
-ACCOUNTS_FILE = "./data/accounts.csv"
-ORDERS_FILE = "./data/orders.csv"
-COMPLAINTS_FILE = "./data/complaints.csv"
-PRODUCTS_FILE = "./data/products.csv"
-
-class DataManager:
-    def __init__(self):
-        self._data: Dict[str, List[Dict[str, str]]] = {
-            'accounts': self._load_csv(ACCOUNTS_FILE),
-            'orders': self._load_csv(ORDERS_FILE),
-            'complaints': self._load_csv(COMPLAINTS_FILE),
-            'products': self._load_csv(PRODUCTS_FILE)
-        }
-        print("--- DataManager: CSV 数据加载完成 ---")
-
-    def _load_csv(self, file_path: str) -> List[Dict[str, str]]:
-        if not os.path.exists(file_path):
-            print(f"警告: 文件 {file_path} 不存在，初始化为空列表。")
-            return []
-        
-        data = []
-        try:
-            with open(file_path, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    data.append(dict(row))
-        except Exception as e:
-            print(f"错误: 加载 {file_path} 失败: {e}")
-            return []
-        return data
-
-    def _save_csv(self, file_path: str, data: List[Dict[str, str]]):
-        if not data:
-            return
-            
-        fieldnames = list(data[0].keys())
-        try:
-            with open(file_path, mode='w', encoding='utf-8', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(data)
-            print(f"[数据操作]: 成功保存数据到 {file_path}")
-        except Exception as e:
-            print(f"错误: 写入 {file_path} 失败: {e}")
-
-    def query_order(self, order_id: str) -> Optional[Dict[str, str]]:
-        for order in self._data['orders']:
-            if order.get('order_id', '').strip() == order_id.strip():
-                return {
-                    'status': order['status'],
-                    'eta': order['eta'],
-                    'product_name': order['product_name']
-                }
-        return None
-
-    def query_product(self, product_name: str) -> Optional[Dict[str, str]]:
-        search_name_lower = product_name.lower()
-        
-        for product in self._data['products']:
-            if search_name_lower in product.get('product_name', '').lower():
-                return product
-        return None
-
-    def submit_complaint(self, account_id: str, issue_description: str) -> Dict[str, Any]:
-        new_ref_id = f"C{int(time.time())}"
-        new_complaint = {
-            'ref_id': new_ref_id,
-            'account_id': account_id if account_id else "Guest",
-            'issue_description': issue_description
-        }
-        self._data['complaints'].append(new_complaint)
-        self._save_csv(COMPLAINTS_FILE, self._data['complaints'])
-        return {'ref_id': new_ref_id}
-
-    def change_password(self, account_id: str, old_password: str, new_password: str) -> bool:
-        found = False
-        success = False
-        for account in self._data['accounts']:
-            if account.get('account_id') == account_id:
-                found = True
-                if account.get('password') == old_password:
-                    account['password'] = new_password
-                    success = True
-                    break
-                else:
-                    success = False
-                    break
-        if success:
-            self._save_csv(ACCOUNTS_FILE, self._data['accounts'])
-            return True
-        return False
-        
-    def deactivate_account(self, account_id: str, old_password: str) -> bool:
-        found_and_matched = False
-        
-        for account in self._data['accounts']:
-            if account.get('account_id') == account_id:
-                if account.get('password') == old_password:
-                    found_and_matched = True
-                break
-
-        if found_and_matched:
-            self._data['accounts'] = [
-                account for account in self._data['accounts'] 
-                if account.get('account_id') != account_id
-            ]
-            self._save_csv(ACCOUNTS_FILE, self._data['accounts'])
-            return True
-        
-        return False
-        
-
 # --- 主控逻辑 ---
 
 # --- 全局配置 ---
 DSL_DIR = "yaml" 
-NLU_MODEL = "doubao-seed-1-6-lite-251015" 
+NLU_MODEL = LITE_MODEL 
+NLU_CASCADE = True  # 先用 lite 模型，结果不合格时再升级到完整模型
+SPECULATIVE_NLU = True  # 菜单状态下并行执行领域路由与意图识别
+DATA_STORAGE = STORAGE_COMPACT  # DataManager 存储模式 (rows / compact / mmap)
+EXIT_COMMANDS = ["退出", "exit", "bye"]
+BACKGROUND_WARM_UP = True  # 启动后在后台线程预加载 DSL、CSV 和 NLU 客户端
+# 由 market_data 行情引擎处理的金融领域动作 (MarketAPI.* 之外)
+FINANCE_ACTIONS = ["AccountAPI.queryBalance", "TradeAPI.execute", "AssessmentAPI.calculateRisk"]
 
 class DialogueContext:
     def __init__(self, initial_state: str):
@@ -134,19 +30,72 @@ class DialogueContext:
         self.api_result = {}
         self.session_active = True
         self.current_domain = "Customer_Service"
+        # 最近一轮的输出记录 (供批处理/测试读取)
+        self.last_nlu_result = {}
+        self.last_responses = []
+        self.last_timings = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出可持久化的会话状态 (用于断点续跑)。
+
+        返回深拷贝：批处理的写出线程稍后才序列化快照，期间会话可能已经继续处理下一轮。
+        """
+        return {
+            "current_state": self.current_state,
+            "current_domain": self.current_domain,
+            "slots_filled": copy.deepcopy(self.slots_filled),
+            "api_result": copy.deepcopy(self.api_result),
+            "session_active": self.session_active,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DialogueContext":
+        context = cls(data["current_state"])
+        context.current_domain = data["current_domain"]
+        context.slots_filled = dict(data.get("slots_filled", {}))
+        context.api_result = dict(data.get("api_result", {}))
+        context.session_active = data.get("session_active", True)
+        return context
 
 class InterpreterCore:
-    def __init__(self, dsl_dir: str, nlu_model: str):
+    def __init__(self, dsl_dir: str, nlu_model: str, speculative: bool = False,
+                 data_storage: str = STORAGE_ROWS,
+                 dsl_manager: Optional[DSLManager] = None,
+                 data_manager: Optional[DataManager] = None,
+                 warm_up: bool = False,
+                 nlu_cascade: Optional[NLUCascade] = None):
         self.nlu_model = nlu_model
+        # 设置级联策略后忽略 nlu_model，由策略决定每轮使用的模型
+        self.nlu_cascade = nlu_cascade
         
-        self.dsl_manager = DSLManager(dsl_dir)
-        self.data_manager = DataManager()
+        # 批处理时多个解释器共享同一份 DSL 配置和数据
+        self.dsl_manager = dsl_manager or DSLManager(dsl_dir)
+        self.data_manager = data_manager or DataManager(storage=data_storage)
+
+        # 推测执行：领域很少变化，因此在路由的同时按当前领域预先识别意图
+        self.speculative = speculative
+        self._nlu_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nlu") if speculative else None
+        # wasted_calls 按模型调用计：未命中的推测请求在后台完成时累加
+        self.speculation_stats = {"attempts": 0, "hits": 0, "misses": 0, "wasted_calls": 0}
+        self._speculation_lock = threading.Lock()
         
         initial_domain = "Customer_Service"
         initial_state = self.dsl_manager.get_initial_state(initial_domain)
         self.context = DialogueContext(initial_state)
         self.context.current_domain = initial_domain
 
+        # DSL 配置、CSV 表和 NLU 客户端都在首次使用时加载；可选在后台提前预热
+        self._warm_up_thread = None
+        if warm_up:
+            self._warm_up_thread = threading.Thread(target=self.warm_up, name="warm-up", daemon=True)
+            self._warm_up_thread.start()
+
+    def warm_up(self):
+        """预加载所有延迟初始化的资源"""
+        self.dsl_manager.preload()
+        self.data_manager.preload()
+        get_client()
+
     def _get_current_flow_model(self) -> dict:
         return self.dsl_manager.get_config(self.context.current_domain)
 
@@ -201,15 +150,157 @@ class InterpreterCore:
             
         # --- 扩展：智能家居/金融的 API 动作 ---
         elif action_str.startswith("DeviceAPI.") or action_str.startswith("SceneAPI."):
-            result_payload = {"status": "success", "api_result": {"status": "已完成", "detail": "设备控制指令已发送。"}}
-        elif action_str.startswith("MarketAPI.") or action_str.startswith("AccountAPI."):
-            result_payload = {"status": "success", "api_result": {"price": "150.00", "change_percent": "+1.5%", "order_id": "T7788"}}
+            result_payload = self._execute_device_action(action_str, slots)
+        elif action_str.startswith("MarketAPI.") or action_str in FINANCE_ACTIONS:
+            result_payload = self._execute_finance_action(action_str, slots)
         
         else:
             result_payload = {"status": "success", "api_result": {"message": "操作成功"}}
             
         return result_payload
 
+    def _execute_device_action(self, action_str: str, slots: dict) -> dict:
+        from device_registry import get_registry
+        registry = get_registry()
+
+        if action_str == "DeviceAPI.queryStatus":
+            status = registry.query_status(slots.get('device_name'))
+            if status:
+                return {"status": "success", "api_result": status}
+            return {"status": "failure", "api_result": {"message": "设备不存在"}}
+
+        if action_str == "SceneAPI.activateScene":
+            report = registry.activate_scene(slots.get('scene_name'))
+            if report is None:
+                return {"status": "failure", "api_result": {"message": "场景不存在", "detail": "场景不存在"}}
+            if report["failed"]:
+                failed = "、".join(
+                    f"{registry.device_label(device_id)}({error})" for device_id, error in report["failed"].items()
+                )
+                detail = f"{len(report['failed'])}/{report['total']} 个设备执行失败：{failed}"
+                return {"status": "failure", "api_result": {**report, "message": detail, "detail": detail}}
+            detail = f"{report['total']} 个设备已执行，耗时 {report['elapsed_ms']:.0f} ms"
+            return {"status": "success", "api_result": {**report, "status": "已完成", "detail": detail}}
+
+        command = action_str.split(".", 1)[1]
+        try:
+            state = registry.execute(slots.get('device_name'), command, slots.get('temperature'))
+        except Exception as e:
+            return {"status": "failure", "api_result": {"message": str(e)}}
+        return {"status": "success", "api_result": {**state, "status": "已完成"}}
+
+    def _execute_finance_action(self, action_str: str, slots: dict) -> dict:
+        # 行情引擎依赖 NumPy 并需要打开行情文件，首次执行金融动作时才导入
+        from market_data import get_engine
+        engine = get_engine()
+
+        if action_str == "MarketAPI.queryQuote":
+            quote = engine.query_quote(slots.get('symbol'))
+            if quote:
+                return {"status": "success", "api_result": quote}
+            return {"status": "failure", "api_result": {"message": "股票代码不存在"}}
+
+        if action_str == "AccountAPI.queryBalance":
+            balance = engine.query_balance(slots.get('account_id'))
+            if balance:
+                return {"status": "success", "api_result": balance}
+            return {"status": "failure", "api_result": {"message": "账户不存在"}}
+
+        if action_str == "TradeAPI.execute":
+            success, trade = engine.execute_trade(
+                slots.get('account_id'), slots.get('symbol'), slots.get('action'), slots.get('quantity')
+            )
+            return {"status": "success" if success else "failure", "api_result": trade}
+
+        if action_str == "AssessmentAPI.calculateRisk":
+            assessment = engine.assess_risk(slots.get('q1_answer'), slots.get('symbol'))
+            if assessment:
+                return {"status": "success", "api_result": assessment}
+            return {"status": "failure", "api_result": {"message": "请选择 A, B 或 C"}}
+
+        return {"status": "failure", "api_result": {"message": f"未知的金融动作 {action_str}"}}
+
+    def _speculative_route(self, user_input: str, intent_map: Dict[str, str],
+                           required_slots: List[str]) -> Tuple[str, Optional[Dict]]:
+        """并行执行领域路由与当前领域的意图识别。
+
+        领域确认未变化时返回推测的 NLU 结果；否则返回 None，由调用方按新领域重新识别。
+        推测请求只调用一次模型 (级联策略的第一级) 且不计入级联统计；命中后才交给级联策略
+        校验、按需升级并记录。未命中时推测请求已经发出，其结果直接丢弃。
+        """
+        current_state = self.context.current_state
+        domain_future = self._nlu_executor.submit(recognize_domain, user_input)
+        intent_future = self._nlu_executor.submit(
+            self._speculate_intent, user_input, intent_map, current_state, required_slots
+        )
+
+        predicted_domain = domain_future.result()
+        with self._speculation_lock:
+            self.speculation_stats["attempts"] += 1
+
+        if predicted_domain == self.context.current_domain:
+            with self._speculation_lock:
+                self.speculation_stats["hits"] += 1
+            speculation, _ = intent_future.result()
+            if self.nlu_cascade is not None:
+                return predicted_domain, self.nlu_cascade.recognize(
+                    user_input, intent_map, current_state, required_slots, self.context.slots_filled,
+                    first_attempt=speculation
+                )
+            return predicted_domain, speculation
+
+        with self._speculation_lock:
+            self.speculation_stats["misses"] += 1
+        intent_future.add_done_callback(self._count_wasted_calls)
+        return predicted_domain, None
+
+    def _speculate_intent(self, user_input: str, intent_map: Dict[str, str],
+                          current_state: str, required_slots: List[str]) -> Tuple[Any, int]:
+        """推测请求：返回 (推测结果, 实际发出的模型调用次数)"""
+        if self.nlu_cascade is not None:
+            speculation = self.nlu_cascade.speculate(user_input, intent_map, current_state, required_slots)
+            return speculation, 0 if speculation is None else 1
+        calls = 0 if get_client() is None else 1
+        return recognize_intent(
+            model=self.nlu_model,
+            user_input=user_input,
+            intent_map=intent_map,
+            current_state=current_state,
+            required_slots=required_slots
+        ), calls
+
+    def _count_wasted_calls(self, future):
+        if future.exception() is not None:
+            return
+        _, calls = future.result()
+        with self._speculation_lock:
+            self.speculation_stats["wasted_calls"] += calls
+
+    def _recognize_intent(self, user_input: str, intent_map: Dict[str, str],
+                          current_state: str, required_slots: List[str]) -> Dict:
+        if self.nlu_cascade is not None:
+            return self.nlu_cascade.recognize(
+                user_input, intent_map, current_state, required_slots, self.context.slots_filled
+            )
+        return recognize_intent(
+            model=self.nlu_model,
+            user_input=user_input, 
+            intent_map=intent_map,
+            current_state=current_state, 
+            required_slots=required_slots
+        )
+
+    def get_speculation_stats(self) -> Dict[str, Any]:
+        """返回推测执行的命中统计，用于评估额外 token 消耗是否划算。
+
+        wasted_calls 为被丢弃的推测请求实际发出的模型调用次数 (仍在进行中的请求完成后才计入)。
+        """
+        with self._speculation_lock:
+            stats = dict(self.speculation_stats)
+        attempts = stats["attempts"]
+        stats["hit_rate"] = stats["hits"] / attempts if attempts else 0.0
+        return stats
+
     def _all_slots_filled(self, state_def: dict) -> bool:
         required = set(state_def.get("REQUIRED_SLOTS", []))
         filled = {k for k, v in self.context.slots_filled.items() if v is not None and str(v).strip() != ''}
@@ -221,7 +312,7 @@ class InterpreterCore:
         for key, value in self.context.slots_filled.items():
             final_prompt = final_prompt.replace(f"${{{key}}}", str(value))
             
-        if 'api_result' in self.context.api_result and self.context.api_result['status'] == 'success':
+        if 'api_result' in self.context.api_result:
             for key, value in self.context.api_result['api_result'].items():
                 final_prompt = final_prompt.replace(f"${{api_result.{key}}}", str(value))
                 
@@ -232,6 +323,7 @@ class InterpreterCore:
             self.context.session_active = False
             return
         final_prompt = self._resolve_prompt(prompt)
+        self.context.last_responses.append(final_prompt)
         print(f"\n🤖 机器人: {final_prompt}")
 
     def _check_slots_and_act(self, state_def: dict):
@@ -268,15 +360,25 @@ class InterpreterCore:
     def process_turn(self, user_input: str):
         if not self.context.session_active: return
 
+        self.context.last_responses = []
+        nlu_start = time.perf_counter()
+
         current_def = self._get_current_state_def()
         required_slots = current_def.get("REQUIRED_SLOTS", [])
         
         flow_model = self._get_current_flow_model()
         current_intent_map = self.dsl_manager.get_intent_map(self.context.current_domain)
         
+        nlu_result = None
+
         # --- 1. 领域切换逻辑 ---
         if self.context.current_state in ["WELCOME", "MAIN_MENU"]:
-            predicted_domain = recognize_domain(user_input)
+            if self.speculative:
+                predicted_domain, nlu_result = self._speculative_route(
+                    user_input, current_intent_map, required_slots
+                )
+            else:
+                predicted_domain = recognize_domain(user_input)
             
             if predicted_domain != self.context.current_domain:
                 print(f"[系统] 领域切换：从 {self.context.current_domain} -> {predicted_domain}")
@@ -291,15 +393,14 @@ class InterpreterCore:
                 current_intent_map = self.dsl_manager.get_intent_map(predicted_domain)
                 required_slots = current_def.get("REQUIRED_SLOTS", [])
 
-        # --- 2. NLU 识别 ---
-        nlu_result = recognize_intent(
-            model=self.nlu_model,
-            user_input=user_input, 
-            intent_map=current_intent_map,
-            current_state=self.context.current_state, 
-            required_slots=required_slots
-        )
+        # --- 2. NLU 识别 (推测命中时直接复用) ---
+        if nlu_result is None:
+            nlu_result = self._recognize_intent(
+                user_input, current_intent_map, self.context.current_state, required_slots
+            )
         
+        self.context.last_nlu_result = nlu_result
+        self.context.last_timings = {"nlu_ms": (time.perf_counter() - nlu_start) * 1000}
         print(f"[NLU 结果]: {nlu_result['intent']} | Slots: {nlu_result['slots']}")
         
         # 3. 更新槽位
@@ -338,13 +439,10 @@ class InterpreterCore:
         # 5. 槽位填充和动作执行 (仅在当前状态下进行)
         self._check_slots_and_act(current_def)
 
-    def run_cli(self):
-        """运行命令行界面的对话循环"""
-        
-        # 1. 打印 WELCOME 提示
+    def start_session(self):
+        """打印 WELCOME 提示，并执行 WELCOME -> MAIN_MENU 的跳转"""
         self._display_prompt(self._get_current_state_def().get("ENTRY_PROMPT"))
         
-        # 2. 强制执行 WELCOME -> MAIN_MENU 的跳转
         welcome_def = self._get_current_state_def()
         if welcome_def.get('ACTION_FULFILLED'):
             action_def = welcome_def['ACTION_FULFILLED']
@@ -355,28 +453,52 @@ class InterpreterCore:
             target_def = self._get_current_state_def()
             
             self._display_prompt(target_def.get("ENTRY_PROMPT"))
+
+    def recover_from_error(self, error: Exception):
+        """单轮处理出错时转入当前领域的 Fallback 状态"""
+        print(f"\n[解释器运行错误]: {error}")
+        flow_model = self._get_current_flow_model()
+        if 'Fallback' in flow_model.get('INTENT_MAP', {}):
+            self.context.current_state = flow_model['INTENT_MAP']['Fallback']
+            self._display_prompt(self._get_current_state_def().get("ENTRY_PROMPT"))
+
+    def run_cli(self):
+        """运行命令行界面的对话循环"""
+        
+        self.start_session()
             
         while self.context.session_active:
             user_input = input(f"\n👤 用户 ({self.context.current_domain}): ")
-            if user_input.lower() in ["退出", "exit", "bye"]:
+            if user_input.lower() in EXIT_COMMANDS:
                 self.context.session_active = False
                 print("会话结束。")
                 break
             try:
                 self.process_turn(user_input)
             except Exception as e:
-                print(f"\n[解释器运行错误]: {e}")
-                flow_model = self._get_current_flow_model()
-                if 'Fallback' in flow_model.get('INTENT_MAP', {}):
-                    self.context.current_state = flow_model['INTENT_MAP']['Fallback']
-                    self._display_prompt(self._get_current_state_def().get("ENTRY_PROMPT"))
+                self.recover_from_error(e)
+
+        if self.speculative:
+            stats = self.get_speculation_stats()
+            print(f"[推测统计]: 尝试 {stats['attempts']} 次，命中 {stats['hits']} 次，"
+                  f"命中率 {stats['hit_rate']:.1%}，浪费调用 {stats['wasted_calls']} 次")
+
+        if self.nlu_cascade is not None:
+            stats = self.nlu_cascade.get_stats()
+            print(f"[级联统计]: 请求 {stats['requests']} 次，升级率 {stats['escalation_rate']:.1%}，"
+                  f"原因 {stats['reasons']}，总成本 {stats['total_cost']:.6f} 元")
+            for model, tier in stats['tiers'].items():
+                print(f"  - {model}: 调用 {tier['calls']} 次，平均延迟 {tier['avg_latency_ms']:.0f}ms，"
+                      f"成本 {tier['cost']:.6f} 元")
 
 
 if __name__ == "__main__":
     print("--- 智能多领域机器人解释器 启动 ---")
     try:
         # 确保 DSL_DIR 指向正确的 yaml 文件目录 (例如: 'C:\\Users\\syk12\\Desktop\\DSL\\yaml')
-        interpreter = InterpreterCore(DSL_DIR, NLU_MODEL) 
+        interpreter = InterpreterCore(DSL_DIR, NLU_MODEL, speculative=SPECULATIVE_NLU,
+                                      data_storage=DATA_STORAGE, warm_up=BACKGROUND_WARM_UP,
+                                      nlu_cascade=NLUCascade() if NLU_CASCADE else None) 
         interpreter.run_cli()
     except Exception as e:
         print(f"\n[致命错误] 初始化失败: {e}")
@@ -0,0 +1,244 @@
+"""LLM 传输层：多端点/多 Key 负载均衡 + 调优的 keep-alive 连接池。
+
+- 每个端点持有独立的 httpx 连接池 (可用 h2 时启用 HTTP/2)，连接在请求间复用。
+- 选择端点时优先选未完成请求数最少的一个，同时遵守各 Key 的每分钟请求数限制 (令牌桶)。
+- 对外暴露与 OpenAI 客户端相同的 `chat.completions.create(...)` 接口，NLU 代码无需改动。
+
+端点配置 (按优先级):
+    ARK_ENDPOINTS   JSON 列表，例如 '[{"base_url": "...", "api_key": "...", "rpm": 600}]'
+                    也可以是指向同格式 JSON 文件的路径
+    ARK_API_KEYS    逗号分隔的多个 Key，共用 ARK_BASE_URL
+    ARK_API_KEY     单个 Key
+"""
+import json
+import math
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+# --- 连接池默认参数 ---
+MAX_CONNECTIONS = 100           # 每个端点的最大连接数
+MAX_KEEPALIVE_CONNECTIONS = 50  # 每个端点保持的空闲长连接数
+KEEPALIVE_EXPIRY = 60.0         # 空闲连接保留秒数
+REQUEST_TIMEOUT = 30.0
+MAX_RETRIES = 2                 # 限流/连接错误时切换端点重试的次数
+DEFAULT_RETRY_AFTER = 1.0       # 429 未给出可用的 Retry-After 时暂停该 Key 的秒数
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """解析 Retry-After 头 (秒数或 HTTP-date，RFC 9110)，无法解析时返回默认值，不抛异常"""
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return DEFAULT_RETRY_AFTER
+    if not math.isfinite(seconds):
+        return DEFAULT_RETRY_AFTER
+    return max(0.0, seconds)
+
+
+class RateLimiter:
+    """令牌桶：每分钟最多 rpm 次请求，允许 rpm/60 秒内的突发。rpm 为空表示不限速。"""
+
+    def __init__(self, rpm: Optional[float] = None):
+        self.rpm = rpm
+        self._capacity = max(1.0, rpm / 60.0) if rpm else 0.0
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rpm:
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rpm / 60.0)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """距离下一个可用令牌还需等待的秒数，0 表示立即可用。"""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if not self.rpm:
+            return 0.0
+        self._refill(now)
+        if self._tokens >= 1.0:
+            return 0.0
+        return (1.0 - self._tokens) * 60.0 / self.rpm
+
+    def consume(self):
+        if self.rpm:
+            self._tokens -= 1.0
+
+    def block(self, seconds: float):
+        """服务端返回 429 时暂停该 Key 一段时间"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class Endpoint:
+    """一个 (base_url, api_key) 组合及其连接池、限流和统计信息"""
+
+    def __init__(self, base_url: str, api_key: str, rpm: Optional[float] = None, name: Optional[str] = None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.name = name or f"{base_url}#{api_key[-4:]}"
+        self.limiter = RateLimiter(rpm)
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rpm": self.limiter.rpm,
+        }
+
+
+def load_endpoints_from_env(default_base_url: str) -> List[Endpoint]:
+    """按 ARK_ENDPOINTS > ARK_API_KEYS > ARK_API_KEY 的优先级读取端点配置"""
+    raw = os.environ.get("ARK_ENDPOINTS")
+    if raw:
+        if os.path.exists(raw):
+            with open(raw, 'r', encoding='utf-8') as f:
+                raw = f.read()
+        return [
+            Endpoint(item.get("base_url", default_base_url), item["api_key"], item.get("rpm"), item.get("name"))
+            for item in json.loads(raw)
+        ]
+
+    base_url = os.environ.get("ARK_BASE_URL", default_base_url)
+    rpm = float(os.environ["ARK_RPM"]) if os.environ.get("ARK_RPM") else None
+    keys = os.environ.get("ARK_API_KEYS") or os.environ.get("ARK_API_KEY") or ""
+    return [Endpoint(base_url, key.strip(), rpm) for key in keys.split(",") if key.strip()]
+
+
+class LLMTransport:
+    """在多个端点之间按最少未完成请求数分发 chat.completions 请求"""
+
+    def __init__(self, endpoints: List[Endpoint],
+                 max_connections: int = MAX_CONNECTIONS,
+                 max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY,
+                 timeout: float = REQUEST_TIMEOUT,
+                 http2: Optional[bool] = None,
+                 max_retries: int = MAX_RETRIES):
+        if not endpoints:
+            raise ValueError("LLMTransport 至少需要一个端点")
+        self.endpoints = endpoints
+        self.max_retries = max_retries
+        self.http2 = http2_available() if http2 is None else http2
+        self._cond = threading.Condition()
+
+        for endpoint in self.endpoints:
+            endpoint.client = self._build_client(
+                endpoint, max_connections, max_keepalive_connections, keepalive_expiry, timeout
+            )
+
+        # 与 OpenAI 客户端兼容的调用入口：transport.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.chat_completion))
+
+    def _build_client(self, endpoint: Endpoint, max_connections: int, max_keepalive_connections: int,
+                      keepalive_expiry: float, timeout: float):
+        import httpx
+        from openai import OpenAI
+
+        http_client = httpx.Client(
+            http2=self.http2,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        # 重试由传输层在端点之间完成，SDK 自身不再重试
+        return OpenAI(base_url=endpoint.base_url, api_key=endpoint.api_key,
+                      http_client=http_client, max_retries=0)
+
+    def _acquire(self, exclude: Optional[Endpoint] = None) -> Endpoint:
+        """选出未完成请求最少且令牌可用的端点；所有端点都被限流时等待最早可用的一个"""
+        with self._cond:
+            while True:
+                candidates = [e for e in self.endpoints if e is not exclude] or self.endpoints
+                best = None
+                shortest_wait = None
+                for endpoint in sorted(candidates, key=lambda e: e.outstanding):
+                    wait = endpoint.limiter.wait_time()
+                    if wait == 0.0:
+                        best = endpoint
+                        break
+                    if shortest_wait is None or wait < shortest_wait:
+                        shortest_wait = wait
+                if best is not None:
+                    best.limiter.consume()
+                    best.outstanding += 1
+                    best.requests += 1
+                    return best
+                self._cond.wait(timeout=shortest_wait)
+
+    def _release(self, endpoint: Endpoint, failed: bool = False, block_for: float = 0.0):
+        with self._cond:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.errors += 1
+            if block_for:
+                endpoint.limiter.block(block_for)
+            self._cond.notify_all()
+
+    def chat_completion(self, **kwargs):
+        """发送一次 chat.completions 请求，遇到限流或连接错误时换一个端点重试"""
+        import openai
+
+        last_endpoint = None
+        for attempt in range(self.max_retries + 1):
+            endpoint = self._acquire(exclude=last_endpoint)
+            try:
+                response = endpoint.client.chat.completions.create(**kwargs)
+            except openai.RateLimitError as e:
+                block_for = DEFAULT_RETRY_AFTER
+                try:
+                    if e.response is not None:
+                        block_for = parse_retry_after(e.response.headers.get("retry-after"))
+                finally:
+                    # 无论响应头如何都要归还端点，否则 outstanding 计数永久偏高
+                    self._release(endpoint, failed=True, block_for=block_for)
+                if attempt == self.max_retries:
+                    raise
+            except (openai.APIConnectionError, openai.InternalServerError):
+                self._release(endpoint, failed=True)
+                if attempt == self.max_retries:
+                    raise
+            except Exception:
+                self._release(endpoint, failed=True)
+                raise
+            else:
+                self._release(endpoint)
+                return response
+            last_endpoint = endpoint
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self):
+        for endpoint in self.endpoints:
+            if endpoint.client is not None:
+                endpoint.client.close()
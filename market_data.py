@@ -0,0 +1,438 @@
+"""本地行情引擎：为 Finance_Advisor 的 MarketAPI / AccountAPI / TradeAPI / AssessmentAPI 动作提供数据。
+
+- 行情存储：所有代码的日线收盘价和成交量各存为一个连续的列文件 (close.f64 / volume.i64)，
+  index.json 记录每个代码在列中的 (偏移, 长度)。文件以 np.memmap 打开，查询只读取所需的切片，
+  报价延迟与代码数量无关。
+- 行情计算：涨跌幅、年化波动率、最大回撤等均以 NumPy 向量化计算。
+- 账户台账：每个账户的现金和持仓保存在 data/portfolios.csv、data/positions.csv，成交记录追加到 data/trades.csv。
+
+行情文件不存在时自动生成一份合成数据 (大盘因子 + 个股特质收益的几何布朗运动)。
+
+用法:
+    python market_data.py --symbols 5000 --days 1000      # 重新生成行情数据
+    python market_data.py --bench 10000                   # 测量报价延迟
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MARKET_DIR = "./data/market"
+CLOSE_FILE = "close.f64"
+VOLUME_FILE = "volume.i64"
+INDEX_FILE = "index.json"
+
+PORTFOLIOS_FILE = "./data/portfolios.csv"
+POSITIONS_FILE = "./data/positions.csv"
+TRADES_FILE = "./data/trades.csv"
+
+TRADING_DAYS = 252               # 年化使用的交易日数，也是风险指标的默认回看窗口
+DEFAULT_SYMBOL_COUNT = 500
+DEFAULT_HISTORY_DAYS = 750
+BENCHMARK_SYMBOL = "MARKET"      # 合成的大盘指数，风险评估以它的波动率为基准
+DEFAULT_ACCOUNT = "demo"         # 交易流程未提供 account_id 时使用的账户
+INITIAL_CASH = 100000.0
+
+# 常见代码及其中文简称 (合成数据中的其余代码为 S00001 形式)
+WELL_KNOWN_SYMBOLS = {
+    "AAPL": "苹果", "MSFT": "微软", "NVDA": "英伟达", "TSLA": "特斯拉", "AMZN": "亚马逊",
+    "GOOGL": "谷歌", "META": "脸书", "BABA": "阿里巴巴", "00700": "腾讯控股", "600519": "贵州茅台",
+    "000858": "五粮液", "300750": "宁德时代", "601318": "中国平安", "BIDU": "百度", "JD": "京东",
+}
+
+# 问卷第一题答案 -> (风险等级, 目标组合年化波动率, 股票仓位上限)
+RISK_PROFILES = {
+    "A": ("保守型", 0.06, 0.30),
+    "B": ("稳健型", 0.12, 0.60),
+    "C": ("进取型", 0.20, 0.90),
+}
+
+TRADE_ACTIONS = {"buy": "buy", "买入": "buy", "买": "buy", "sell": "sell", "卖出": "sell", "卖": "sell"}
+
+
+class PriceStore:
+    """只读的列式行情文件，按代码返回收盘价/成交量切片 (内存映射视图，不复制数据)"""
+
+    def __init__(self, market_dir: str = MARKET_DIR):
+        with open(os.path.join(market_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.symbols: Dict[str, Tuple[int, int]] = {s: (o, n) for s, (o, n) in meta["symbols"].items()}
+        self.aliases: Dict[str, str] = meta.get("aliases", {})
+        self.close = np.memmap(os.path.join(market_dir, CLOSE_FILE), dtype=np.float64, mode='r')
+        self.volume = np.memmap(os.path.join(market_dir, VOLUME_FILE), dtype=np.int64, mode='r')
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def resolve(self, symbol: Optional[str]) -> Optional[str]:
+        """把用户输入的代码或中文简称规范化为存储中的代码"""
+        if not symbol:
+            return None
+        symbol = str(symbol).strip()
+        if symbol in self.aliases:
+            return self.aliases[symbol]
+        symbol = symbol.upper()
+        return symbol if symbol in self.symbols else None
+
+    def series(self, symbol: str, window: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 symbol 最近 window 个交易日的 (收盘价, 成交量)"""
+        offset, length = self.symbols[symbol]
+        start = offset if window is None else offset + max(0, length - window)
+        end = offset + length
+        return self.close[start:end], self.volume[start:end]
+
+    def last_prices(self, symbols: List[str]) -> np.ndarray:
+        """一次取出多个代码的最新收盘价"""
+        if not symbols:
+            return np.empty(0, dtype=np.float64)
+        ends = np.fromiter((sum(self.symbols[s]) - 1 for s in symbols), dtype=np.int64, count=len(symbols))
+        return np.asarray(self.close[ends])
+
+
+def write_store(market_dir: str, series: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                aliases: Optional[Dict[str, str]] = None):
+    """把 {代码: (收盘价, 成交量)} 写成列文件；先写临时文件再替换，读者不会看到写了一半的数据"""
+    os.makedirs(market_dir, exist_ok=True)
+    index = {}
+    offset = 0
+    for symbol, (close, _) in series.items():
+        index[symbol] = [offset, len(close)]
+        offset += len(close)
+
+    columns = (
+        (CLOSE_FILE, np.float64, lambda item: item[0]),
+        (VOLUME_FILE, np.int64, lambda item: item[1]),
+    )
+    for file_name, dtype, pick in columns:
+        tmp_path = os.path.join(market_dir, file_name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            for item in series.values():
+                np.ascontiguousarray(pick(item), dtype=dtype).tofile(f)
+        os.replace(tmp_path, os.path.join(market_dir, file_name))
+
+    tmp_path = os.path.join(market_dir, INDEX_FILE + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"symbols": index, "aliases": aliases or {}}, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(market_dir, INDEX_FILE))
+
+
+def seed_market_data(market_dir: str = MARKET_DIR, symbols: int = DEFAULT_SYMBOL_COUNT,
+                     days: int = DEFAULT_HISTORY_DAYS, seed: int = 42) -> int:
+    """生成合成行情：个股收益 = beta * 大盘收益 + 特质噪声，部分代码上市时间较短。返回代码数量。"""
+    rng = np.random.default_rng(seed)
+    names = list(WELL_KNOWN_SYMBOLS)[:symbols]
+    names += [f"S{i:05d}" for i in range(1, symbols - len(names) + 1)]
+    count = len(names)
+
+    market_returns = rng.normal(0.0003, 0.011, days)
+    betas = rng.uniform(0.6, 1.5, count)[:, None]
+    idio = rng.uniform(0.008, 0.03, count)[:, None]
+    returns = betas * market_returns + rng.normal(0.0, 1.0, (count, days)) * idio
+    prices = rng.uniform(5.0, 500.0, count)[:, None] * np.exp(np.cumsum(returns, axis=1))
+    volumes = rng.lognormal(13.0, 1.0, (count, days)).astype(np.int64)
+    listed_days = rng.integers(days // 4, days + 1, count)
+    listed_days[:len(WELL_KNOWN_SYMBOLS)] = days
+
+    series = {BENCHMARK_SYMBOL: (3000.0 * np.exp(np.cumsum(market_returns)), volumes.sum(axis=0))}
+    for i, name in enumerate(names):
+        series[name] = (np.round(prices[i, -listed_days[i]:], 2), volumes[i, -listed_days[i]:])
+
+    aliases = {alias: symbol for symbol, alias in WELL_KNOWN_SYMBOLS.items() if symbol in series}
+    aliases["大盘"] = BENCHMARK_SYMBOL
+    write_store(market_dir, series, aliases)
+    return len(series)
+
+
+def annualized_volatility(close: np.ndarray) -> float:
+    if len(close) < 3:
+        return 0.0
+    log_returns = np.diff(np.log(close))
+    return float(log_returns.std(ddof=1) * np.sqrt(TRADING_DAYS))
+
+
+def max_drawdown(close: np.ndarray) -> float:
+    if len(close) == 0:
+        return 0.0
+    return float((1.0 - close / np.maximum.accumulate(close)).max())
+
+
+def _parse_quantity(value: Any) -> Optional[int]:
+    match = re.search(r"\d+", str(value or ""))
+    return int(match.group()) if match else None
+
+
+class AccountLedger:
+    """账户现金与持仓台账，每次交易后整表写回 CSV 并追加成交记录"""
+
+    def __init__(self, portfolios_file: str = PORTFOLIOS_FILE, positions_file: str = POSITIONS_FILE,
+                 trades_file: str = TRADES_FILE):
+        self.portfolios_file = portfolios_file
+        self.positions_file = positions_file
+        self.trades_file = trades_file
+        self._lock = threading.RLock()
+        self._trade_seq = 0
+        self.cash: Dict[str, float] = {}
+        self.positions: Dict[str, Dict[str, List[float]]] = {}   # account -> symbol -> [数量, 成本价]
+        self._load()
+
+    def _load(self):
+        for row in self._read_csv(self.portfolios_file):
+            self.cash[row['account_id']] = float(row['cash_balance'])
+        for row in self._read_csv(self.positions_file):
+            self.positions.setdefault(row['account_id'], {})[row['symbol']] = [
+                int(row['quantity']), float(row['avg_cost'])
+            ]
+        if DEFAULT_ACCOUNT not in self.cash:
+            self.cash[DEFAULT_ACCOUNT] = INITIAL_CASH
+
+    @staticmethod
+    def _read_csv(file_path: str) -> List[Dict[str, str]]:
+        if not os.path.exists(file_path):
+            return []
+        with open(file_path, mode='r', encoding='utf-8', newline='') as file:
+            return list(csv.DictReader(file))
+
+    def _save(self):
+        """先把现金表和持仓表都完整写入临时文件，再依次原子替换 (与 write_store 相同)。
+
+        写入过程中出错或崩溃时两个正式文件都保持旧内容，不会出现现金已扣减而持仓缺失的台账。
+        """
+        tables = (
+            (self.portfolios_file, ["account_id", "cash_balance"],
+             [(account, f"{cash:.2f}") for account, cash in self.cash.items()]),
+            (self.positions_file, ["account_id", "symbol", "quantity", "avg_cost"],
+             [(account, symbol, qty, f"{cost:.4f}")
+              for account, holdings in self.positions.items() for symbol, (qty, cost) in holdings.items()]),
+        )
+        tmp_paths = [f"{file_path}.{os.getpid()}.tmp" for file_path, _, _ in tables]
+        try:
+            for (_, header, rows), tmp_path in zip(tables, tmp_paths):
+                with open(tmp_path, mode='w', encoding='utf-8', newline='') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(header)
+                    writer.writerows(rows)
+            for (file_path, _, _), tmp_path in zip(tables, tmp_paths):
+                os.replace(tmp_path, file_path)
+        finally:
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        print(f"[数据操作]: 成功保存账户台账到 {self.portfolios_file}")
+
+    def _append_trade(self, row: List[Any]):
+        is_new = not os.path.exists(self.trades_file)
+        with open(self.trades_file, mode='a', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            if is_new:
+                writer.writerow(["order_id", "account_id", "symbol", "action", "quantity", "price", "timestamp"])
+            writer.writerow(row)
+
+    def snapshot(self, account_id: str) -> Optional[Tuple[float, Dict[str, int]]]:
+        """返回 (现金, {代码: 持仓数量})，账户不存在时返回 None"""
+        with self._lock:
+            if account_id not in self.cash:
+                return None
+            holdings = {symbol: qty for symbol, (qty, _) in self.positions.get(account_id, {}).items()}
+            return self.cash[account_id], holdings
+
+    def execute(self, account_id: str, symbol: str, action: str, quantity: int, price: float) -> Dict[str, Any]:
+        """按成交价更新现金和持仓；失败时抛出 ValueError，消息直接展示给用户"""
+        with self._lock:
+            if account_id not in self.cash:
+                raise ValueError(f"账户 {account_id} 不存在")
+            holdings = self.positions.setdefault(account_id, {})
+            amount = price * quantity
+            held_qty, avg_cost = holdings.get(symbol, [0, 0.0])
+            previous_cash, previous_holding = self.cash[account_id], holdings.get(symbol)
+
+            if action == "buy":
+                if amount > self.cash[account_id]:
+                    raise ValueError(f"资金不足，需要 {amount:.2f}，可用 {self.cash[account_id]:.2f}")
+                self.cash[account_id] -= amount
+                new_qty = held_qty + quantity
+                holdings[symbol] = [new_qty, (held_qty * avg_cost + amount) / new_qty]
+            else:
+                if quantity > held_qty:
+                    raise ValueError(f"持仓不足，当前持有 {held_qty} 股")
+                self.cash[account_id] += amount
+                if quantity == held_qty:
+                    del holdings[symbol]
+                else:
+                    holdings[symbol] = [held_qty - quantity, avg_cost]
+
+            try:
+                self._save()
+            except OSError as e:
+                # 台账未落盘，撤销内存中的修改，保持与文件一致
+                self.cash[account_id] = previous_cash
+                if previous_holding is None:
+                    holdings.pop(symbol, None)
+                else:
+                    holdings[symbol] = previous_holding
+                raise ValueError(f"账户台账保存失败，交易未执行: {e}")
+            self._trade_seq += 1
+            order_id = f"T{int(time.time())}{self._trade_seq:04d}"
+            self._append_trade([order_id, account_id, symbol, action, quantity, f"{price:.2f}",
+                                time.strftime("%Y-%m-%d %H:%M:%S")])
+            return {"order_id": order_id, "price": f"{price:.2f}", "amount": f"{amount:.2f}",
+                    "cash_balance": f"{self.cash[account_id]:.2f}"}
+
+
+class MarketEngine:
+    """行情存储 + 账户台账，对应 DSL 中金融领域的各个 API 动作。行情文件首次使用时打开 (缺失则生成)。"""
+
+    def __init__(self, market_dir: str = MARKET_DIR, ledger: Optional[AccountLedger] = None):
+        self.market_dir = market_dir
+        self._ledger = ledger
+        self._store: Optional[PriceStore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> PriceStore:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    if not os.path.exists(os.path.join(self.market_dir, INDEX_FILE)):
+                        count = seed_market_data(self.market_dir)
+                        print(f"[系统] 未找到行情数据，已生成 {count} 个代码的合成行情到 {self.market_dir}")
+                    self._store = PriceStore(self.market_dir)
+        return self._store
+
+    @property
+    def ledger(self) -> AccountLedger:
+        if self._ledger is None:
+            with self._lock:
+                if self._ledger is None:
+                    self._ledger = AccountLedger()
+        return self._ledger
+
+    # --- DSL 核心动作函数 ---
+
+    def query_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """最新收盘价、相对前一交易日的涨跌幅和成交量"""
+        code = self.store.resolve(symbol)
+        if code is None:
+            return None
+        close, volume = self.store.series(code, window=2)
+        last = float(close[-1])
+        previous = float(close[-2]) if len(close) > 1 else last
+        return {
+            "symbol": code,
+            "price": f"{last:.2f}",
+            "change_percent": f"{(last / previous - 1.0) * 100:+.2f}%",
+            "volume": int(volume[-1]),
+        }
+
+    def risk_metrics(self, symbol: str, window: int = TRADING_DAYS) -> Optional[Dict[str, float]]:
+        """回看窗口内的年化波动率和最大回撤"""
+        code = self.store.resolve(symbol)
+        if code is None:
+            return None
+        close, _ = self.store.series(code, window=window + 1)
+        return {"volatility": annualized_volatility(close), "max_drawdown": max_drawdown(close)}
+
+    def assess_risk(self, q1_answer: str, symbol: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """根据问卷答案确定风险等级，再按基准 (或指定代码) 的实际波动率折算建议股票仓位"""
+        answer = str(q1_answer or "").strip().upper()[:1]
+        if answer not in RISK_PROFILES:
+            return None
+        level, target_volatility, max_ratio = RISK_PROFILES[answer]
+        metrics = (symbol and self.risk_metrics(symbol)) or self.risk_metrics(BENCHMARK_SYMBOL)
+        volatility = metrics["volatility"]
+        stock_ratio = min(max_ratio, target_volatility / volatility) if volatility > 0 else max_ratio
+        return {
+            "level": level,
+            "stock_ratio": f"{stock_ratio:.0%}",
+            "volatility": f"{volatility:.1%}",
+            "max_drawdown": f"{metrics['max_drawdown']:.1%}",
+        }
+
+    def query_balance(self, account_id: str) -> Optional[Dict[str, Any]]:
+        """可用现金和按最新价计算的总资产"""
+        snapshot = self.ledger.snapshot(account_id)
+        if snapshot is None:
+            return None
+        cash, holdings = snapshot
+        symbols = [s for s in holdings if s in self.store.symbols]
+        quantities = np.array([holdings[s] for s in symbols], dtype=np.float64)
+        market_value = float(np.dot(quantities, self.store.last_prices(symbols))) if symbols else 0.0
+        return {
+            "cash_balance": f"{cash:.2f}",
+            "market_value": f"{market_value:.2f}",
+            "total_assets": f"{cash + market_value:.2f}",
+        }
+
+    def execute_trade(self, account_id: Optional[str], symbol: str, action: str,
+                      quantity: Any) -> Tuple[bool, Dict[str, Any]]:
+        """按最新收盘价成交。返回 (是否成功, api_result)"""
+        code = self.store.resolve(symbol)
+        if code is None:
+            return False, {"message": f"未找到股票代码 {symbol}"}
+        side = TRADE_ACTIONS.get(str(action or "").strip().lower())
+        if side is None:
+            return False, {"message": f"无法识别的交易类型 {action}"}
+        qty = _parse_quantity(quantity)
+        if not qty:
+            return False, {"message": f"交易数量无效: {quantity}"}
+
+        price = float(self.store.series(code, window=1)[0][-1])
+        try:
+            return True, self.ledger.execute(account_id or DEFAULT_ACCOUNT, code, side, qty, price)
+        except ValueError as e:
+            return False, {"message": str(e)}
+
+
+# 进程内共享的引擎 (与 NLU 客户端一样首次使用时创建)
+_engine: Optional[MarketEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> MarketEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MarketEngine()
+    return _engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地行情数据生成与报价延迟测试")
+    parser.add_argument("--market-dir", default=MARKET_DIR, help="行情文件目录")
+    parser.add_argument("--symbols", type=int, help="重新生成行情数据的代码数量")
+    parser.add_argument("--days", type=int, default=DEFAULT_HISTORY_DAYS, help="每个代码的交易日数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--bench", type=int, default=0, help="随机报价的次数 (0 表示不测)")
+    args = parser.parse_args()
+
+    if args.symbols:
+        start = time.perf_counter()
+        count = seed_market_data(args.market_dir, args.symbols, args.days, args.seed)
+        print(f"已生成 {count} 个代码 x {args.days} 个交易日到 {args.market_dir} ({time.perf_counter() - start:.1f}s)")
+
+    if args.bench:
+        engine = MarketEngine(args.market_dir)
+        symbols = list(engine.store.symbols)
+        rng = np.random.default_rng(args.seed)
+        picks = [symbols[i] for i in rng.integers(0, len(symbols), args.bench)]
+        latency = np.empty(args.bench)
+        for i, symbol in enumerate(picks):
+            start = time.perf_counter()
+            engine.query_quote(symbol)
+            latency[i] = (time.perf_counter() - start) * 1e6
+        print(json.dumps({
+            "symbols": len(symbols),
+            "quotes": args.bench,
+            "p50_us": float(np.percentile(latency, 50)),
+            "p99_us": float(np.percentile(latency, 99)),
+        }))
+
+
+if __name__ == "__main__":
+    main()
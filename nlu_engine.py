@@ -1,7 +1,7 @@
-import os
 import json
-from openai import OpenAI
-from typing import Dict, List, Any
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple
 
 # --- 用于 NLU 转换的预定义信息 ---
 SYSTEM_INSTRUCTIONS = """
@@ -53,14 +53,47 @@ SYSTEM_INSTRUCTIONS = """
 # 定义所有可用的领域
 DOMAINS = ["Customer_Service", "Smart_Home", "Finance_Advisor"]
 
-# 初始化OpenAI客户端，从环境变量中读取您的API Key
-client = OpenAI(
-    base_url="https://ark.cn-beijing.volces.com/api/v3",
-    api_key=os.environ.get("ARK_API_KEY"),
-)
+ARK_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
 
-def recognize_domain(user_input: str) -> str:
-    client_instance = client
+# --- 模型分级 ---
+LITE_MODEL = "doubao-seed-1-6-lite-251015"
+FULL_MODEL = "doubao-seed-1-6-251015"
+DOMAIN_MODEL = FULL_MODEL
+
+# 单价 (元/百万 tokens: 输入, 输出)，用于级联策略的成本统计，请按实际价格调整
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    LITE_MODEL: (0.3, 0.6),
+    FULL_MODEL: (0.8, 2.0),
+}
+
+# LLM 客户端延迟到第一次 NLU 调用时才导入和创建 (openai 包本身的导入耗时接近 1 秒)
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """返回共享的 LLM 传输层 (接口与 OpenAI 客户端一致)，首次调用时创建；未配置任何 API Key 时返回 None。
+
+    端点和 Key 从环境变量读取，见 llm_transport.load_endpoints_from_env。
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from llm_transport import LLMTransport, load_endpoints_from_env
+                endpoints = load_endpoints_from_env(ARK_BASE_URL)
+                if not endpoints:
+                    return None
+                _client = LLMTransport(endpoints)
+    return _client
+
+def __getattr__(name: str):
+    # 兼容旧代码直接访问 nlu_engine.client
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def recognize_domain(user_input: str, model: str = DOMAIN_MODEL) -> str:
+    client_instance = get_client()
     if client_instance is None:
         return "Customer_Service"
 
@@ -79,7 +112,7 @@ def recognize_domain(user_input: str) -> str:
 
     try:
         resp = client_instance.chat.completions.create(
-            model="doubao-seed-1-6-251015",
+            model=model,
             messages=messages,
             temperature=0.0,
         )
@@ -94,20 +127,15 @@ def recognize_domain(user_input: str) -> str:
         print(f"[Domain 错误] LLM调用失败: {e}")
         return "Customer_Service"
 
-def recognize_intent(
-    model: str, 
-    user_input: str, 
+def _request_intent(
+    client_instance,
+    model: str,
+    user_input: str,
     intent_map: Dict[str, str],
-    current_state: str, 
+    current_state: str,
     required_slots: List[str]
-) -> Dict:
-    if not os.environ.get("ARK_API_KEY"):
-        return {"intent": "Fallback", "slots": {}}
-        
-    client_instance = client
-    if client_instance is None:
-        return {"intent": "Fallback", "slots": {}}
-        
+) -> Tuple[Optional[Dict], Dict[str, int]]:
+    """调用一次意图识别模型，返回 (解析后的 JSON, token 用量)。调用失败或 JSON 无效时结果为 None。"""
     available_intents = list(intent_map.keys())
     
     context_prompt = f"""
@@ -125,12 +153,18 @@ def recognize_intent(
         {"role": "user", "content": context_prompt}
     ]
     
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
     try:
         resp = client_instance.chat.completions.create(
             model=model,
             messages=messages,
             temperature=0.0,
         )
+        if getattr(resp, "usage", None) is not None:
+            usage = {
+                "prompt_tokens": resp.usage.prompt_tokens or 0,
+                "completion_tokens": resp.usage.completion_tokens or 0,
+            }
         
         json_text = resp.choices[0].message.content.strip()
         
@@ -138,14 +172,175 @@ def recognize_intent(
         if json_text.startswith("```json"):
             json_text = json_text.strip("```json").strip("```").strip()
             
-        nlu_result = json.loads(json_text)
-        
-        # 验证意图是否在当前 DSL 中可用
-        if nlu_result.get('intent') not in available_intents:
-            nlu_result['intent'] = "Fallback"
-            
-        return nlu_result
+        return json.loads(json_text), usage
         
     except Exception as e:
-        print(f"[NLU 错误] API 调用或 JSON 解析失败: {e}")
-        return {"intent": "Fallback", "slots": {}}
\ No newline at end of file
+        print(f"[NLU 错误] API 调用或 JSON 解析失败 ({model}): {e}")
+        return None, usage
+
+def recognize_intent(
+    model: str, 
+    user_input: str, 
+    intent_map: Dict[str, str],
+    current_state: str, 
+    required_slots: List[str]
+) -> Dict:
+    client_instance = get_client()
+    if client_instance is None:
+        return {"intent": "Fallback", "slots": {}}
+        
+    nlu_result, _ = _request_intent(
+        client_instance, model, user_input, intent_map, current_state, required_slots
+    )
+    if not isinstance(nlu_result, dict):
+        return {"intent": "Fallback", "slots": {}}
+        
+    # 验证意图是否在当前 DSL 中可用
+    if nlu_result.get('intent') not in intent_map:
+        nlu_result['intent'] = "Fallback"
+        
+    return nlu_result
+
+
+class NLUCascade:
+    """分级 NLU 策略：先用便宜的模型，输出不合格时才升级到更大的模型。
+
+    升级条件 (按顺序检查)：
+    - invalid_json：调用失败、JSON 无效或结构不对
+    - fallback：意图为 Fallback 或不在当前 INTENT_MAP 中
+    - missing_slots：意图仍停留在当前状态，当前状态还有未填的必需槽位，且本轮一个都没抽取到
+    """
+
+    def __init__(self, models: Optional[List[str]] = None):
+        self.models = models or [LITE_MODEL, FULL_MODEL]
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._escalations = 0
+        self._reasons: Dict[str, int] = {"invalid_json": 0, "fallback": 0, "missing_slots": 0}
+        self._tiers: Dict[str, Dict[str, float]] = {
+            model: {"calls": 0, "latency_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+            for model in self.models
+        }
+
+    def _validate(
+        self,
+        nlu_result: Optional[Dict],
+        intent_map: Dict[str, str],
+        current_state: str,
+        required_slots: List[str],
+        filled_slots: Dict[str, Any]
+    ) -> Optional[str]:
+        """返回升级原因，结果合格时返回 None"""
+        if not isinstance(nlu_result, dict) or not isinstance(nlu_result.get("intent"), str) \
+                or not isinstance(nlu_result.get("slots", {}), dict):
+            return "invalid_json"
+
+        intent = nlu_result["intent"]
+        if intent == "Fallback" or intent not in intent_map:
+            return "fallback"
+
+        if required_slots and intent_map[intent] == current_state:
+            slots = nlu_result.get("slots", {})
+            missing = [s for s in required_slots if not filled_slots.get(s) and not slots.get(s)]
+            extracted = [s for s in required_slots if slots.get(s)]
+            if missing and not extracted:
+                return "missing_slots"
+        return None
+
+    def _record(self, model: str, latency_ms: float, usage: Dict[str, int]):
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        with self._lock:
+            tier = self._tiers[model]
+            tier["calls"] += 1
+            tier["latency_ms"] += latency_ms
+            tier["prompt_tokens"] += usage["prompt_tokens"]
+            tier["completion_tokens"] += usage["completion_tokens"]
+            tier["cost"] += (usage["prompt_tokens"] * input_price
+                             + usage["completion_tokens"] * output_price) / 1_000_000
+
+    def speculate(
+        self,
+        user_input: str,
+        intent_map: Dict[str, str],
+        current_state: str,
+        required_slots: List[str]
+    ) -> Optional[Tuple[Optional[Dict], Dict[str, int], float]]:
+        """推测执行用：只调用第一级模型，不升级也不计入统计。
+
+        返回 (解析后的 JSON, token 用量, 延迟 ms)，未配置 API Key 时返回 None。
+        推测结果被采用时再交给 recognize(first_attempt=...) 完成校验、升级和统计。
+        """
+        client_instance = get_client()
+        if client_instance is None:
+            return None
+        start = time.perf_counter()
+        nlu_result, usage = _request_intent(
+            client_instance, self.models[0], user_input, intent_map, current_state, required_slots
+        )
+        return nlu_result, usage, (time.perf_counter() - start) * 1000
+
+    def recognize(
+        self,
+        user_input: str,
+        intent_map: Dict[str, str],
+        current_state: str,
+        required_slots: List[str],
+        filled_slots: Optional[Dict[str, Any]] = None,
+        first_attempt: Optional[Tuple[Optional[Dict], Dict[str, int], float]] = None
+    ) -> Dict:
+        """与 recognize_intent 返回格式一致，额外带上 'model' 字段标明最终采用的模型。
+
+        first_attempt 为 speculate() 的返回值时，第一级直接使用它，不再重复调用。
+        """
+        client_instance = get_client()
+        if client_instance is None:
+            return {"intent": "Fallback", "slots": {}}
+
+        with self._lock:
+            self._requests += 1
+
+        nlu_result = None
+        for level, model in enumerate(self.models):
+            if level == 0 and first_attempt is not None:
+                nlu_result, usage, latency_ms = first_attempt
+            else:
+                start = time.perf_counter()
+                nlu_result, usage = _request_intent(
+                    client_instance, model, user_input, intent_map, current_state, required_slots
+                )
+                latency_ms = (time.perf_counter() - start) * 1000
+            self._record(model, latency_ms, usage)
+
+            reason = self._validate(nlu_result, intent_map, current_state, required_slots, filled_slots or {})
+            if reason is None:
+                break
+            if level < len(self.models) - 1:
+                print(f"[NLU 级联]: {model} 结果不合格 ({reason})，升级到 {self.models[level + 1]}")
+                with self._lock:
+                    if level == 0:
+                        self._escalations += 1
+                    self._reasons[reason] += 1
+
+        if not isinstance(nlu_result, dict) or not isinstance(nlu_result.get("intent"), str):
+            return {"intent": "Fallback", "slots": {}, "model": model}
+        if nlu_result["intent"] not in intent_map:
+            nlu_result["intent"] = "Fallback"
+        nlu_result.setdefault("slots", {})
+        nlu_result["model"] = model
+        return nlu_result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各级模型的调用次数、平均延迟、token 用量和成本，以及升级率"""
+        with self._lock:
+            tiers = {}
+            for model, tier in self._tiers.items():
+                tiers[model] = dict(tier)
+                tiers[model]["avg_latency_ms"] = tier["latency_ms"] / tier["calls"] if tier["calls"] else 0.0
+            return {
+                "requests": self._requests,
+                "escalations": self._escalations,
+                "escalation_rate": self._escalations / self._requests if self._requests else 0.0,
+                "reasons": dict(self._reasons),
+                "tiers": tiers,
+                "total_cost": sum(t["cost"] for t in self._tiers.values()),
+            }
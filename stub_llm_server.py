@@ -0,0 +1,166 @@
+"""本地 OpenAI 兼容桩服务器，用于在无外网/无额度时测试 LLM 传输层的连接池、负载均衡和限流。
+
+- POST .../chat/completions：领域分类请求返回 "Customer_Service"，其余返回 Greeting 意图 JSON
+- GET /stats：返回本服务器收到的请求数、当前并发数和按 Key 统计的请求数
+- --rpm 模拟每个 Key 的限流，超出时返回 429 和 Retry-After
+- --lite-fallback-rate 让名称含 "lite" 的模型按该概率返回 Fallback，用于测试模型级联的升级路径
+
+用法 (启动 3 个端口，并打印可直接使用的 ARK_ENDPOINTS)：
+    python stub_llm_server.py --servers 3 --base-port 18080 --latency-ms 50 --rpm 600
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, latency_ms: float = 0.0, rpm: float = 0.0, lite_fallback_rate: float = 0.0):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.latency = latency_ms / 1000.0
+        self.rpm = rpm
+        self.lite_fallback_rate = lite_fallback_rate
+        self.lock = threading.Lock()
+        self.total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.per_key = defaultdict(int)
+        self._recent = defaultdict(deque)   # key -> 最近 60 秒的请求时间
+
+    def admit(self, api_key: str) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            recent = self._recent[api_key]
+            while recent and now - recent[0] > 60.0:
+                recent.popleft()
+            if self.rpm and len(recent) >= self.rpm:
+                return False
+            recent.append(now)
+            self.total += 1
+            self.per_key[api_key] += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "port": self.server_address[1],
+                "total": self.total,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "per_key": dict(self.per_key),
+            }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # 支持 keep-alive，便于观察连接复用
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        api_key = self.headers.get("Authorization", "").replace("Bearer ", "")
+        if not self.server.admit(api_key):
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                            headers={"Retry-After": "1"})
+            return
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            system_prompt = next(
+                (m.get("content", "") for m in request.get("messages", []) if m.get("role") == "system"), ""
+            )
+            model = request.get("model", "stub")
+            if "领域分类器" in system_prompt:
+                content = "Customer_Service"
+            elif "lite" in model and random.random() < self.server.lite_fallback_rate:
+                content = json.dumps({"intent": "Fallback", "slots": {}}, ensure_ascii=False)
+            else:
+                content = json.dumps({"intent": "Greeting", "slots": {}}, ensure_ascii=False)
+            self._send_json(200, {
+                "id": f"stub-{self.server.total}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+            })
+        finally:
+            self.server.done()
+
+
+def start_servers(count: int, base_port: int, latency_ms: float = 0.0, rpm: float = 0.0,
+                  lite_fallback_rate: float = 0.0) -> List[StubLLMServer]:
+    """在后台线程启动 count 个桩服务器 (端口 base_port 起连续编号)"""
+    servers = []
+    for i in range(count):
+        server = StubLLMServer(base_port + i, latency_ms=latency_ms, rpm=rpm,
+                               lite_fallback_rate=lite_fallback_rate)
+        threading.Thread(target=server.serve_forever, name=f"stub-llm-{base_port + i}", daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容桩服务器")
+    parser.add_argument("--servers", type=int, default=1, help="启动的服务器数量")
+    parser.add_argument("--base-port", type=int, default=18080, help="起始端口")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="每个请求的模拟延迟")
+    parser.add_argument("--rpm", type=float, default=0.0, help="每个 Key 每分钟请求上限 (0 表示不限)")
+    parser.add_argument("--lite-fallback-rate", type=float, default=0.0, help="lite 模型返回 Fallback 的概率")
+    args = parser.parse_args()
+
+    servers = start_servers(args.servers, args.base_port, args.latency_ms, args.rpm, args.lite_fallback_rate)
+    endpoints = [
+        {"base_url": f"http://127.0.0.1:{s.server_address[1]}/api/v3", "api_key": f"stub-key-{i}"}
+        for i, s in enumerate(servers)
+    ]
+    print("桩服务器已启动，可使用以下配置：")
+    print(f"ARK_ENDPOINTS='{json.dumps(endpoints)}'")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
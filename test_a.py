@@ -6,8 +6,9 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from interpreter_core import InterpreterCore
+    from nlu_engine import FULL_MODEL
     DSL_DIR = "yaml" 
-    NLU_MODEL = "doubao-seed-1-6-251015"
+    NLU_MODEL = FULL_MODEL
 except ImportError as e:
     print(f"错误：无法导入 InterpreterCore 或配置。请确保 interpreter_core.py 文件存在于当前目录。")
     print(f"原始错误: {e}")